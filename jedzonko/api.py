@@ -0,0 +1,207 @@
+"""
+JSON API for recipes, plans and plan weeks, and for adding meals to a plan.
+
+Every GET endpoint takes an optional `fields` parameter with a comma-separated list
+of fields to return, and only those columns are read from the database, so the
+large text fields of a recipe are loaded only when a client asks for them. List
+endpoints stream a JSON array from a chunked database iterator, so memory use is
+flat however many rows they return.
+
+POST requests need the CSRF token in the X-CSRFToken header, like the forms of
+the site.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from jedzonko.meal_grid import MealGridError, add_meals
+from jedzonko.models import DayName, Plan, Recipe, RecipePlan
+
+RECIPE_FIELDS = ('id', 'name', 'description', 'preparation_time', 'vote', 'created', 'updated',
+                 'ingredients', 'how_to_prepare')
+RECIPE_DEFAULT_FIELDS = ('id', 'name', 'description', 'preparation_time', 'vote')
+PLAN_FIELDS = ('id', 'name', 'description', 'created', 'updated')
+MEAL_FIELDS = ('meal_name', 'meal_order', 'recipe_id')
+
+CHUNK_SIZE = 500
+
+
+class FieldError(ValueError):
+    pass
+
+
+def requested_fields(request, allowed, default):
+    """
+    Return the fields named in the `fields` parameter, or the default ones.
+
+    Raises FieldError for a field that is not in `allowed`.
+    """
+    if not request.GET.get('fields'):
+        return list(default)
+    fields = [field.strip() for field in request.GET['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise FieldError("Unknown fields: %s. Allowed fields: %s" % (', '.join(unknown), ', '.join(allowed)))
+    return fields
+
+
+def stream_json_array(rows):
+    """
+    Yield a JSON array of the rows in pieces of CHUNK_SIZE rows.
+    """
+    yield '['
+    chunk = []
+    separator = ''
+    for row in rows:
+        chunk.append(separator + json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+        separator = ','
+        if len(chunk) == CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk) + ']'
+
+
+class ApiView(View):
+    """
+    Base view turning FieldError into a 400 response and a missing object into a JSON 404.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except FieldError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404 as error:
+            return JsonResponse({'error': str(error) or 'Not found'}, status=404)
+
+    def get_row(self, queryset, fields, **lookup):
+        row = queryset.filter(**lookup).values(*fields).first()
+        if row is None:
+            raise Http404('%s not found' % queryset.model.__name__)
+        return row
+
+
+class RecipeListApiView(ApiView):
+    """
+    View streaming all recipes as a JSON array, ordered by id.
+
+    Methods:
+    - get(self, request): Handles GET requests, with optional `fields`, `after` (an id) and `limit`.
+    """
+    def get(self, request):
+        fields = requested_fields(request, RECIPE_FIELDS, RECIPE_DEFAULT_FIELDS)
+        recipes = Recipe.objects.order_by('id')
+        if request.GET.get('after', '').isdigit():
+            recipes = recipes.filter(id__gt=int(request.GET['after']))
+        if request.GET.get('limit', '').isdigit():
+            recipes = recipes[:int(request.GET['limit'])]
+        rows = recipes.values(*fields).iterator(chunk_size=CHUNK_SIZE)
+        return StreamingHttpResponse(stream_json_array(rows), content_type='application/json')
+
+
+class RecipeApiView(ApiView):
+    """
+    View returning one recipe as JSON.
+
+    Methods:
+    - get(self, request, id): Handles GET requests, with optional `fields`; all fields by default.
+    """
+    def get(self, request, id):
+        fields = requested_fields(request, RECIPE_FIELDS, RECIPE_FIELDS)
+        return JsonResponse(self.get_row(Recipe.objects, fields, id=id), json_dumps_params={'ensure_ascii': False})
+
+
+class PlanListApiView(ApiView):
+    """
+    View streaming all meal plans as a JSON array, ordered by id.
+
+    Methods:
+    - get(self, request): Handles GET requests, with optional `fields`, `after` (an id) and `limit`.
+    """
+    def get(self, request):
+        fields = requested_fields(request, PLAN_FIELDS, PLAN_FIELDS)
+        plans = Plan.objects.order_by('id')
+        if request.GET.get('after', '').isdigit():
+            plans = plans.filter(id__gt=int(request.GET['after']))
+        if request.GET.get('limit', '').isdigit():
+            plans = plans[:int(request.GET['limit'])]
+        rows = plans.values(*fields).iterator(chunk_size=CHUNK_SIZE)
+        return StreamingHttpResponse(stream_json_array(rows), content_type='application/json')
+
+
+class PlanApiView(ApiView):
+    """
+    View returning one meal plan as JSON.
+
+    Methods:
+    - get(self, request, id): Handles GET requests, with optional `fields`.
+    """
+    def get(self, request, id):
+        fields = requested_fields(request, PLAN_FIELDS, PLAN_FIELDS)
+        return JsonResponse(self.get_row(Plan.objects, fields, id=id), json_dumps_params={'ensure_ascii': False})
+
+
+class PlanWeekApiView(ApiView):
+    """
+    View returning the meals of a plan grouped by day, in week order.
+
+    The meals and the requested recipe fields are read with one joined query.
+
+    Methods:
+    - get(self, request, id): Handles GET requests, with optional `fields` naming recipe fields
+      (id and name by default).
+    """
+    def get(self, request, id):
+        recipe_fields = requested_fields(request, RECIPE_FIELDS, ('id', 'name'))
+        plan = self.get_row(Plan.objects, ('id', 'name'), id=id)
+        columns = list(MEAL_FIELDS) + ['recipe__' + field for field in recipe_fields]
+        meals = RecipePlan.objects.filter(plan_id=id).order_by('weekday', 'meal_order').values('weekday', *columns)
+
+        plan['days'] = [{'day': day.value, 'meals': []} for day in DayName]
+        for meal in meals:
+            plan['days'][meal['weekday']]['meals'].append({
+                'meal_name': meal['meal_name'],
+                'meal_order': meal['meal_order'],
+                'recipe': {field: meal['recipe__' + field] for field in recipe_fields},
+            })
+        return JsonResponse(plan, json_dumps_params={'ensure_ascii': False})
+
+
+class PlanMealsApiView(ApiView):
+    """
+    View adding a grid of meals, such as a whole week, to a plan in one request.
+
+    The body is a JSON object with a `meals` list of cells, each with `day` (0 for
+    Monday to 6, or 'MON' to 'SUN'), `order`, `recipe_id` and an optional
+    `meal_name` (see jedzonko.meal_grid). Either every meal is added or none is.
+
+    Methods:
+    - post(self, request, id): Handles POST requests; responds 201 with the added meals,
+      or 400 with the errors of every invalid cell.
+
+    Example request body:
+    {"meals": [{"day": "MON", "order": 1, "recipe_id": 12}, {"day": 0, "order": 2, "recipe_id": 40}]}
+    """
+    def post(self, request, id):
+        plan = self.get_row(Plan.objects, ('id', 'name'), id=id)
+        try:
+            body = json.loads(request.body.decode())
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        try:
+            meals = add_meals(id, body.get('meals') if isinstance(body, dict) else None)
+        except MealGridError as error:
+            if None in error.errors:
+                result = {'error': error.errors[None]}
+            else:
+                result = {'errors': [{'cell': index, 'errors': errors}
+                                     for index, errors in sorted(error.errors.items())]}
+            return JsonResponse(result, status=400, json_dumps_params={'ensure_ascii': False})
+        plan['meals'] = [{
+            'day': DayName.from_weekday(meal.weekday).value,
+            'meal_name': meal.meal_name,
+            'meal_order': meal.meal_order,
+            'recipe_id': meal.recipe_id,
+        } for meal in meals]
+        return JsonResponse(plan, status=201, json_dumps_params={'ensure_ascii': False})
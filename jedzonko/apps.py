@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class JedzonkoConfig(AppConfig):
     name = 'jedzonko'
+
+    def ready(self):
+        import jedzonko.signals  # noqa: F401
+        from jedzonko.votes import check_vote_buffer
+        checks.register(check_vote_buffer)
@@ -0,0 +1,62 @@
+"""
+Exact row counts of recipes and plans, read in O(1) from the RowCount table.
+
+jedzonko.signals adds one for every saved new row and subtracts one for every
+deleted row. The signal runs after the row is written, so the two share a
+transaction only when the caller opens one: the views, Plan.clone,
+generate_plan and the import commands write inside transaction.atomic, while a
+bare save() in autocommit mode commits the row before the counter. Code writing
+rows with bulk_create, which sends no signals, calls add() itself. A missing
+counter is counted when it is first read, and reconcile(), run by the
+`reconcile_counts` management command, corrects any drift from writes that
+bypassed both or failed between the two statements.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from jedzonko.models import Plan, Recipe, RowCount
+
+COUNTED = {
+    'recipe': Recipe,
+    'plan': Plan,
+}
+
+
+def add(name, delta):
+    """
+    Change the counter by delta.
+    """
+    if not RowCount.objects.filter(name=name).update(count=F('count') + delta):
+        reconcile([name])
+
+
+def get_counts(*names):
+    """
+    Return {name: count} of the counters, read with one query.
+
+    Example usage:
+    >>> get_counts('recipe', 'plan')
+    {'recipe': 1204, 'plan': 37}
+    """
+    counts = dict(RowCount.objects.filter(name__in=names).values_list('name', 'count'))
+    missing = [name for name in names if name not in counts]
+    if missing:
+        counts.update((name, count) for name, (count, _) in reconcile(missing).items())
+    return counts
+
+
+def reconcile(names=None):
+    """
+    Count the rows again and correct the counters.
+
+    Returns {name: (count, previous count or None)}.
+    """
+    result = {}
+    for name in names or COUNTED:
+        with transaction.atomic():
+            counter, created = RowCount.objects.select_for_update().get_or_create(name=name)
+            previous = None if created else counter.count
+            counter.count = COUNTED[name].objects.count()
+            counter.save(update_fields=['count'])
+        result[name] = (counter.count, previous)
+    return result
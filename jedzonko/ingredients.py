@@ -0,0 +1,203 @@
+"""
+Parsing of the free-text Recipe.ingredients into Ingredient and RecipeIngredient rows.
+"""
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from jedzonko.models import Ingredient, RecipeIngredient
+
+ParsedIngredient = namedtuple('ParsedIngredient', ['name', 'quantity', 'unit'])
+
+UNITS = {
+    'g': 'g', 'gr': 'g', 'gram': 'g', 'gramy': 'g', 'gramów': 'g',
+    'dag': 'dag', 'dkg': 'dag',
+    'kg': 'kg', 'kilogram': 'kg', 'kilogramy': 'kg',
+    'ml': 'ml', 'l': 'l', 'litr': 'l', 'litry': 'l', 'litrów': 'l',
+    'szt': 'szt', 'sztuka': 'szt', 'sztuki': 'szt', 'sztuk': 'szt',
+    'łyżka': 'łyżka', 'łyżki': 'łyżka', 'łyżek': 'łyżka',
+    'łyżeczka': 'łyżeczka', 'łyżeczki': 'łyżeczka', 'łyżeczek': 'łyżeczka',
+    'szklanka': 'szklanka', 'szklanki': 'szklanka', 'szklanek': 'szklanka',
+    'szczypta': 'szczypta', 'szczypty': 'szczypta',
+    'ząbek': 'ząbek', 'ząbki': 'ząbek', 'ząbków': 'ząbek',
+    'opakowanie': 'opakowanie', 'opakowania': 'opakowanie', 'opak': 'opakowanie',
+    'plaster': 'plaster', 'plastry': 'plaster', 'plastrów': 'plaster',
+    'pęczek': 'pęczek', 'pęczki': 'pęczek',
+    'puszka': 'puszka', 'puszki': 'puszka',
+    'cup': 'cup', 'cups': 'cup', 'tbsp': 'tbsp', 'tsp': 'tsp', 'oz': 'oz', 'lb': 'lb',
+    'pcs': 'szt', 'pc': 'szt',
+}
+
+QUANTITY_FIELD = RecipeIngredient._meta.get_field('quantity')
+# Quantities that do not fit RecipeIngredient.quantity are dropped, keeping the name.
+MAX_QUANTITY = Decimal(10) ** (QUANTITY_FIELD.max_digits - QUANTITY_FIELD.decimal_places)
+
+FRACTIONS = {'½': '1/2', '¼': '1/4', '¾': '3/4', '⅓': '1/3', '⅔': '2/3'}
+
+# A comma followed by a digit is a decimal comma ("0,5 kg"), not a separator.
+SEPARATOR = re.compile(r'[\n;]|,(?!\d)')
+NUMBER = r'\d+(?:[.,]\d+)?(?:/\d+)?'
+# A range ("3-4 jajka") is stored as its upper bound, so a shopping list has enough.
+QUANTITY = r'(?P<quantity>(?:\d+\s+)?' + NUMBER + r')(?:\s*[-–]\s*(?P<upper>' + NUMBER + r'))?'
+LEADING = re.compile(r'^' + QUANTITY + r'\s*(?P<rest>.*)$')
+# Searched for, not matched from the start: a name followed by a run of separators
+# would otherwise be split at every position of the run, in quadratic time.
+TRAILING = re.compile(r'(?<=[\s:(\-–])' + QUANTITY + r'\s*(?P<unit>[^\W\d]+)?\.?\)?$')
+NAME_STRIP = ' \t.,:;-–*•'
+# Longer lines are cut before matching; the stored name is cut to this length anyway.
+MAX_LINE_LENGTH = Ingredient._meta.get_field('name').max_length
+
+
+def parse_quantity(text):
+    """
+    Return the quantity written as '2', '0,5', '1/2' or '1 1/2' as a Decimal, or None.
+
+    None is also returned for a quantity too large for RecipeIngredient.quantity.
+    """
+    try:
+        total = Decimal(0)
+        for part in text.replace(',', '.').split():
+            numerator, _, denominator = part.partition('/')
+            total += Decimal(numerator) / Decimal(denominator) if denominator else Decimal(numerator)
+        total = total.quantize(Decimal('0.001'))
+    except (InvalidOperation, ZeroDivisionError):
+        return None
+    return total if total < MAX_QUANTITY else None
+
+
+def match_quantity(match):
+    """
+    Return the quantity of a LEADING or TRAILING match, the upper bound for a range.
+    """
+    quantity = parse_quantity(match.group('quantity'))
+    if match.group('upper') is not None:
+        upper = parse_quantity(match.group('upper'))
+        quantity = max(quantity, upper) if quantity is not None and upper is not None else None
+    return quantity
+
+
+def _closed_at_end(name):
+    """
+    Return whether the bracket opening the name is closed by its last character.
+    """
+    depth = 0
+    for index, char in enumerate(name):
+        depth += (char == '(') - (char == ')')
+        if depth == 0:
+            return index == len(name) - 1
+    return False
+
+
+def strip_brackets(name):
+    """
+    Strip the brackets at the ends of a name that have no pair, and a pair enclosing the whole name.
+
+    Example usage:
+    >>> strip_brackets('pieprz (szczypta)'), strip_brackets('sól (')
+    ('pieprz (szczypta)', 'sól')
+    """
+    while name:
+        if name.endswith('(') or name.endswith(')') and name.count(')') > name.count('('):
+            name = name[:-1].rstrip(NAME_STRIP)
+        elif name.startswith(')') or name.startswith('(') and name.count('(') > name.count(')'):
+            name = name[1:].lstrip(NAME_STRIP)
+        elif name.startswith('(') and _closed_at_end(name):
+            name = name[1:-1].strip(NAME_STRIP)
+        else:
+            break
+    return name
+
+
+def normalize_name(name):
+    """
+    Return the ingredient name in the form it is stored and looked up in.
+    """
+    return ' '.join(strip_brackets(name.strip(NAME_STRIP)).lower().split())[:MAX_LINE_LENGTH]
+
+
+def parse_ingredients(text):
+    """
+    Split the free-text ingredients of a recipe into (name, quantity, unit) items.
+
+    Items are separated by new lines, semicolons or commas, and the quantity with an
+    optional unit may stand before or after the name. Units are normalized to one
+    form, so '2 łyżki' and '1 łyżka' share the unit 'łyżka'.
+
+    Example usage:
+    >>> parse_ingredients('200 g mąki, 2 jajka\\nmleko - 0,5 l')
+    [ParsedIngredient(name='mąki', quantity=Decimal('200.000'), unit='g'),
+     ParsedIngredient(name='jajka', quantity=Decimal('2.000'), unit=''),
+     ParsedIngredient(name='mleko', quantity=Decimal('0.500'), unit='l')]
+    """
+    items = []
+    for part in SEPARATOR.split(text or ''):
+        part = part.strip(' \t\r-*•')
+        for symbol, fraction in FRACTIONS.items():
+            part = part.replace(symbol, ' ' + fraction)
+        part = part.strip()[:MAX_LINE_LENGTH]
+        if not part:
+            continue
+
+        name, quantity, unit = part, None, ''
+        leading = LEADING.match(part)
+        trailing = TRAILING.search(part)
+        if leading:
+            first, _, rest = leading.group('rest').partition(' ')
+            if first.rstrip('.').lower() not in UNITS:
+                name, quantity = leading.group('rest'), match_quantity(leading)
+            elif rest:
+                # A quantity and a unit without a name, like '5 kg', stay as they are written.
+                name, quantity, unit = rest, match_quantity(leading), UNITS[first.rstrip('.').lower()]
+        elif trailing and (trailing.group('unit') or '').lower() in UNITS.keys() | {''} \
+                and part[:trailing.start()].strip(NAME_STRIP + '('):
+            name = part[:trailing.start()]
+            quantity = match_quantity(trailing)
+            unit = UNITS.get((trailing.group('unit') or '').lower(), '')
+        if quantity is None:
+            unit = ''
+
+        name = normalize_name(name)
+        if name:
+            items.append(ParsedIngredient(name, quantity, unit))
+    return items
+
+
+def save_recipe_ingredients(recipes, batch_size=500):
+    """
+    Replace the RecipeIngredient rows of the recipes with the ones parsed from their text.
+
+    The work is done per batch of recipes with a fixed number of queries: one to
+    look up known ingredient names, one bulk insert of new names, one delete and
+    one bulk insert of the recipe rows.
+
+    Returns a dict of the parsed ingredients by recipe id, for jedzonko.similar.index_recipes.
+    """
+    recipes = list(recipes)
+    result = {}
+    for start in range(0, len(recipes), batch_size):
+        batch = recipes[start:start + batch_size]
+        parsed = {recipe.id: parse_ingredients(recipe.ingredients) for recipe in batch}
+        result.update(parsed)
+        names = sorted({item.name for items in parsed.values() for item in items})
+
+        with transaction.atomic():
+            ingredients = {}
+            for offset in range(0, len(names), batch_size):
+                chunk = names[offset:offset + batch_size]
+                ingredients.update(Ingredient.objects.filter(name__in=chunk).values_list('name', 'id'))
+                missing = [name for name in chunk if name not in ingredients]
+                if missing:
+                    Ingredient.objects.bulk_create([Ingredient(name=name) for name in missing],
+                                                   ignore_conflicts=True)
+                    ingredients.update(Ingredient.objects.filter(name__in=missing).values_list('name', 'id'))
+
+            RecipeIngredient.objects.filter(recipe_id__in=list(parsed)).delete()
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredients[item.name],
+                                 quantity=item.quantity, unit=item.unit, position=position)
+                for recipe_id, items in parsed.items()
+                for position, item in enumerate(items)
+            ])
+    return result
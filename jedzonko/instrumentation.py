@@ -0,0 +1,134 @@
+"""
+Per-request timings of SQL queries, template rendering and the whole request.
+
+TimingMiddleware measures a sample of requests (settings.TIMING_SAMPLE_RATE).
+For a measured request every query on every database connection goes through an
+execute wrapper that adds up its time, and TimedDjangoTemplates, the template
+backend, adds up the time of top-level template renders, including any queries
+they run. The totals are sent in a Server-Timing header, and requests slower than
+settings.SLOW_REQUEST_THRESHOLD are logged to the 'jedzonko.slow_requests' logger
+as one JSON line with their slowest statements. Requests that are not sampled
+pass through untouched. For a streaming response only the work done before
+streaming starts is counted.
+"""
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('jedzonko.slow_requests')
+
+_current = ContextVar('request_timings', default=None)
+
+MAX_SQL_LENGTH = 1000
+
+
+class RequestTimings:
+    """
+    Time spent in one request, in seconds.
+
+    Attributes:
+    - queries (int): Number of SQL statements executed.
+    - sql (float): Time spent executing them.
+    - template (float): Time spent rendering templates.
+    - statements (list): (duration, number, sql) of the slowest statements, as a heap.
+    """
+    def __init__(self, keep):
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.statements = []
+        self.keep = keep
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.sql += duration
+            if len(self.statements) < self.keep:
+                heapq.heappush(self.statements, (duration, self.queries, sql))
+            elif self.keep and duration > self.statements[0][0]:
+                heapq.heapreplace(self.statements, (duration, self.queries, sql))
+
+    def slowest(self):
+        return [{'ms': round(duration * 1000, 2), 'sql': sql[:MAX_SQL_LENGTH]}
+                for duration, _, sql in sorted(self.statements, reverse=True)]
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend whose templates report their render time to TimingMiddleware.
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class TimingMiddleware:
+    """
+    Middleware adding a Server-Timing header and logging slow requests.
+
+    It should be the first middleware, so the total covers the other ones.
+
+    Example header:
+    Server-Timing: db;dur=3.21;desc="4 queries", tpl;dur=5.87, total;dur=12.40
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'TIMING_SAMPLE_RATE', 1.0)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        timings = RequestTimings(getattr(settings, 'SLOW_REQUEST_QUERIES', 5))
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+
+        response['Server-Timing'] = 'db;dur=%.2f;desc="%d queries", tpl;dur=%.2f, total;dur=%.2f' % (
+            timings.sql * 1000, timings.queries, timings.template * 1000, total * 1000)
+        if total >= getattr(settings, 'SLOW_REQUEST_THRESHOLD', 0.5):
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'db_ms': round(timings.sql * 1000, 2),
+                'queries': timings.queries,
+                'template_ms': round(timings.template * 1000, 2),
+                'slowest_queries': timings.slowest(),
+            }, ensure_ascii=False))
+        return response
@@ -0,0 +1,80 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a new interpreter, so every run is a cold worker. It starts the
+# application the way scrumlab/wsgi.py does, with or without the warm-up, and
+# requests the paths one after another through the WSGI interface.
+WORKER = """
+import json, os, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+from jedzonko.warmup import warmup
+application = get_wsgi_application()
+loaded = time.perf_counter()
+if sys.argv[1] == 'warm':
+    warmup()
+ready = time.perf_counter()
+responses = []
+for path in sys.argv[3:]:
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': sys.argv[2], 'SERVER_PORT': '80',
+               'HTTP_HOST': sys.argv[2], 'wsgi.url_scheme': 'http', 'wsgi.input': sys.stdin.buffer,
+               'wsgi.errors': sys.stderr}
+    began = time.perf_counter()
+    status = []
+    body = application(environ, lambda status_line, headers: status.append(status_line))
+    b''.join(body)
+    body.close()
+    responses.append((status[0], time.perf_counter() - began))
+print(json.dumps({'boot': loaded - start, 'warmup': ready - loaded, 'responses': responses}))
+"""
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the first requests of a cold worker, with and without the warm-up of jedzonko.warmup.
+
+    Every run starts a new Python process, loads the application, optionally warms
+    it up, and times each path requested in turn. The first path shows the
+    time to first response of a new worker, the later ones what is left to warm.
+    Medians of --repeat runs are reported. With DEBUG on the templates are not
+    cached between requests, so the warm-up gains less than in production.
+
+    Example usage:
+    $ python manage.py bench_cold_start --repeat 5 / /recipe/list/
+    """
+    help = "Compare the first responses of a cold worker with and without the warm-up."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=['/', '/main/', '/recipe/list/'])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'scrumlab.settings'))
+        results = {}
+        for mode in ('cold', 'warm'):
+            runs = []
+            for _ in range(options['repeat']):
+                worker = subprocess.run(
+                    [sys.executable, '-c', WORKER, mode, options['host']] + options['paths'],
+                    cwd=settings.BASE_DIR, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, universal_newlines=True)
+                if worker.returncode:
+                    raise CommandError(worker.stderr)
+                runs.append(json.loads(worker.stdout.splitlines()[-1]))
+            results[mode] = runs
+
+        self.stdout.write('%-6s %9s %9s  %s' % ('', 'boot', 'warm-up', '  '.join(options['paths'])))
+        for mode, runs in results.items():
+            boot = statistics.median(run['boot'] for run in runs)
+            warm = statistics.median(run['warmup'] for run in runs)
+            firsts = ['%.1f ms (%s)' % (statistics.median(run['responses'][index][1] for run in runs) * 1000,
+                                        runs[0]['responses'][index][0].split()[0])
+                      for index in range(len(options['paths']))]
+            self.stdout.write('%-6s %6.1f ms %6.1f ms  %s' % (mode, boot * 1000, warm * 1000, '  '.join(firsts)))
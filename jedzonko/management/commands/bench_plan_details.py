@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+
+from jedzonko.models import Plan, Recipe, RecipePlan, DayName
+
+# The day x meal scan PlanDetailsView used before it switched to Plan.week().
+SCAN_TEMPLATE = """
+{% for weekday, day in days %}{{ day }}
+    {% for meal in meals %}{% if meal.weekday == weekday %}
+        {{ meal.meal_name }} {{ meal.recipe.name }} /recipe/{{ meal.recipe.id }}/
+    {% endif %}{% endfor %}
+{% endfor %}
+"""
+
+WEEK_TEMPLATE = """
+{% for day, meals in week %}{{ day }}
+    {% for meal in meals %}
+        {{ meal.meal_name }} {{ meal.recipe.name }} /recipe/{{ meal.recipe_id }}/
+    {% endfor %}
+{% endfor %}
+"""
+
+
+class Command(BaseCommand):
+    """
+    Benchmark rendering the plan details week table for a large plan.
+
+    The plan and its recipes are created inside a transaction that is rolled back,
+    so the command can be run against any database without leaving data behind.
+
+    Example usage:
+    $ python manage.py bench_plan_details --meals 500 --repeat 5
+    """
+    help = "Compare the per-day template scan with the pre-bucketed plan week."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meals', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            plan = self.create_plan(options['meals'])
+            scan = self.measure(options['repeat'], lambda: Template(SCAN_TEMPLATE).render(Context({
+                'days': [(day.weekday, day.value) for day in DayName],
+                'meals': RecipePlan.objects.filter(plan=plan).order_by('meal_order'),
+            })))
+            week = self.measure(options['repeat'], lambda: Template(WEEK_TEMPLATE).render(Context({
+                'week': plan.week(),
+            })))
+            transaction.set_rollback(True)
+
+        for label, (seconds, queries) in (('day scan', scan), ('plan week', week)):
+            self.stdout.write('%-10s %8.1f ms %6d queries' % (label, seconds * 1000, queries))
+        self.stdout.write('speedup    %8.1fx' % (scan[0] / week[0]))
+
+    def create_plan(self, meals):
+        plan = Plan.objects.create(name='Benchmark', description='Benchmark')
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name='Przepis %s' % i, ingredients='-', description='-', preparation_time=10)
+            for i in range(meals)
+        )
+        if not recipes or recipes[0].pk is None:
+            recipes = list(Recipe.objects.order_by('-id')[:meals])
+        days = list(DayName)
+        RecipePlan.objects.bulk_create(
+            RecipePlan(plan=plan, recipe=recipe, meal_name='Posiłek %s' % i,
+                       meal_order=i // len(days), weekday=days[i % len(days)].weekday)
+            for i, recipe in enumerate(recipes)
+        )
+        return plan
+
+    def measure(self, repeat, render):
+        """
+        Return the best wall time of `repeat` renders and the query count of one render.
+        """
+        best = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                render()
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(queries)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jedzonko.models import DayName, Plan
+
+
+class Command(BaseCommand):
+    """
+    Copy a meal plan with all its meals.
+
+    Example usage:
+    $ python manage.py clone_plan 12 --name "Tydzień 5" --shift-days 1 --map SAT=SUN
+    """
+    help = "Copy a meal plan with all its meals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('plan_id', type=int)
+        parser.add_argument('--name', help="Name of the copy, the name of the plan by default.")
+        parser.add_argument('--shift-days', type=int, default=0,
+                            help="Move every meal this many days forward, wrapping around the week.")
+        parser.add_argument('--map', nargs='*', default=[], metavar='DAY=DAY',
+                            help="Move the meals of a day to another day, e.g. SAT=SUN.")
+
+    def handle(self, *args, **options):
+        try:
+            plan = Plan.objects.get(pk=options['plan_id'])
+        except Plan.DoesNotExist:
+            raise CommandError("Plan %s does not exist" % options['plan_id'])
+
+        day_map = {}
+        for mapping in options['map']:
+            source, _, target = mapping.upper().partition('=')
+            if source not in DayName.__members__ or target not in DayName.__members__:
+                raise CommandError("Invalid day mapping %s, use day names like MON=TUE" % mapping)
+            day_map[DayName[source]] = DayName[target]
+
+        new_plan = plan.clone(name=options['name'], shift_days=options['shift_days'], day_map=day_map)
+        self.stdout.write('Created plan %s (%s) with %d meals'
+                          % (new_plan.id, new_plan.name, new_plan.recipeplan_set.count()))
@@ -0,0 +1,98 @@
+import re
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from jedzonko.models import Plan, Recipe
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+SORT = 'USE TEMP B-TREE FOR ORDER BY'
+CURSOR_LINK = re.compile(r'href="\?cursor=([\w-]+)"')
+# Nothing computed from the throwaway data may outlive the rollback in the shared cache.
+ISOLATED_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'explain'}}
+
+
+class Command(BaseCommand):
+    """
+    Check that no query of the main views falls back to a full table scan with a sort.
+
+    The command seeds a throwaway data set with seed_data inside a transaction that is rolled
+    back, requests every view through the test client, runs EXPLAIN QUERY PLAN on
+    each SELECT and fails if a plan both scans a whole table and sorts the result
+    in a temporary b-tree, which means an ORDER BY has no matching index. It only
+    supports SQLite, the database used for local tests.
+
+    Example usage:
+    $ python manage.py explain_views --verbosity 2
+    """
+    help = "Fail if a view query needs a full table scan with a sort."
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("explain_views supports SQLite only")
+
+        problems = []
+        with transaction.atomic(), override_settings(CACHES=ISOLATED_CACHES):
+            plan = self.seed()
+            for url in self.urls(plan):
+                for sql in self.capture(url):
+                    detail = self.explain(sql)
+                    if options['verbosity'] > 1:
+                        self.stdout.write('%s\n  %s\n  %s' % (url, sql, '\n  '.join(detail)))
+                    if SORT in detail and any(FULL_SCAN.match(line) for line in detail):
+                        problems.append('%s\n  %s\n  %s' % (url, sql, '\n  '.join(detail)))
+            transaction.set_rollback(True)
+
+        if problems:
+            raise CommandError("Queries with a full scan and a sort:\n" + '\n'.join(problems))
+        self.stdout.write('No full scans with a sort found')
+
+    def seed(self):
+        call_command('seed_data', recipes=50, plans=10, meals=21, stdout=StringIO())
+        connection.cursor().execute('ANALYZE')
+        return Plan.objects.order_by('-id').first()
+
+    def urls(self, plan):
+        recipe = Recipe.objects.order_by('-vote').first()
+        return [
+            reverse('index'),
+            reverse('dashboard'),
+            reverse('recipe_list'),
+            reverse('recipe_list') + '?cursor=' + self.next_cursor('recipe_list'),
+            reverse('recipe_list') + '?q=przepis',
+            reverse('recipe_details', kwargs={'id': recipe.id}),
+            reverse('plan_list'),
+            reverse('plan_list') + '?cursor=' + self.next_cursor('plan_list'),
+            reverse('plan_details', kwargs={'id': plan.id}),
+            reverse('shopping_list', kwargs={'id': plan.id}),
+            reverse('shopping_list', kwargs={'id': plan.id}) + '?per_day=1',
+        ]
+
+    def client(self):
+        hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+        return Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+
+    def next_cursor(self, name):
+        """
+        Return the cursor of the second page, taken from the 'next' link of the first one.
+        """
+        content = self.client().get(reverse(name)).content.decode()
+        return CURSOR_LINK.search(content).group(1)
+
+    def capture(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client().get(url)
+        if response.status_code != 200:
+            raise CommandError("%s returned %s" % (url, response.status_code))
+        return [query['sql'] for query in queries if query['sql'].lstrip().upper().startswith('SELECT')]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
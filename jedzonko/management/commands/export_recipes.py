@@ -0,0 +1,68 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jedzonko.models import Recipe
+
+FIELDS = ('name', 'ingredients', 'description', 'preparation_time', 'vote', 'how_to_prepare', 'created', 'updated')
+
+
+def recipe_format(path, format):
+    """
+    Return the file format given explicitly or by the extension of the path.
+    """
+    if format:
+        return format
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith('.jsonl'):
+        return 'jsonl'
+    raise CommandError("Cannot tell the format of %s, use --format" % path)
+
+
+class Command(BaseCommand):
+    """
+    Export all recipes to a JSONL or CSV file.
+
+    Recipes are read with a server-side cursor in chunks and written one by one, so
+    memory use does not grow with the number of recipes.
+
+    Example usage:
+    $ python manage.py export_recipes recipes.jsonl
+    $ python manage.py export_recipes - --format csv > recipes.csv
+    """
+    help = "Export recipes to JSONL or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, '-' for standard output.")
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        format = recipe_format(options['path'], options['format'])
+        rows = Recipe.objects.order_by('id').values_list(*FIELDS).iterator(chunk_size=options['chunk_size'])
+
+        output = sys.stdout if options['path'] == '-' else open(options['path'], 'w', newline='', encoding='utf-8')
+        start = time.perf_counter()
+        exported = 0
+        try:
+            if format == 'csv':
+                writer = csv.writer(output)
+                writer.writerow(FIELDS)
+            for row in rows:
+                row = [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+                if format == 'csv':
+                    writer.writerow(row)
+                else:
+                    output.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n')
+                exported += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        elapsed = time.perf_counter() - start
+        self.stderr.write('Exported %d recipes in %.1f s (%.0f recipes/s)'
+                          % (exported, elapsed, exported / elapsed if elapsed else 0))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jedzonko.votes import flush_votes
+
+
+class Command(BaseCommand):
+    """
+    Write votes buffered in the cache to the database.
+
+    Run it once from cron, or keep it running with --interval so the database sees
+    at most one batch of updates per interval however many votes come in.
+
+    Example usage:
+    $ python manage.py flush_votes --interval 5
+    """
+    help = "Write buffered recipe votes to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Seconds between flushes; flush once and exit when 0.")
+
+    def handle(self, *args, **options):
+        while True:
+            updated = flush_votes(batch_size=options['batch_size'])
+            self.stdout.write('Updated votes of %d recipes' % updated)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jedzonko.planner import PlanGenerationError, generate_plan
+
+
+class Command(BaseCommand):
+    """
+    Generate a weekly meal plan from the recipe catalog.
+
+    Meals are drawn with a preference for well-voted recipes, keeping the cooking
+    time of every day under --max-day-time minutes and not repeating a recipe
+    within --no-repeat-days days.
+
+    Example usage:
+    $ python manage.py generate_plan "Tydzień 1" --meals 3 --max-day-time 90 --no-repeat-days 7 --seed 1
+    """
+    help = "Generate a weekly meal plan from the recipe catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name')
+        parser.add_argument('--meals', type=int, default=3, help="Meals per day.")
+        parser.add_argument('--max-day-time', type=int, help="Maximum preparation time per day in minutes.")
+        parser.add_argument('--no-repeat-days', type=int, default=7,
+                            help="A recipe is not repeated within this many days.")
+        parser.add_argument('--description', default='')
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            plan = generate_plan(options['name'], meals_per_day=options['meals'],
+                                 max_day_time=options['max_day_time'], no_repeat_days=options['no_repeat_days'],
+                                 description=options['description'], seed=options['seed'])
+        except PlanGenerationError as error:
+            raise CommandError(error)
+        self.stdout.write('Created plan %s (%s) with %d meals in %.1f ms'
+                          % (plan.id, plan.name, plan.recipeplan_set.count(), (time.perf_counter() - start) * 1000))
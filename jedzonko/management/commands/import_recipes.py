@@ -0,0 +1,159 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Max, Value, When
+
+from jedzonko.counters import add
+from jedzonko.ingredients import save_recipe_ingredients
+from jedzonko.management.commands.export_recipes import FIELDS, recipe_format
+from jedzonko.models import Recipe
+from jedzonko.search import index_recipe_range
+from jedzonko.similar import index_recipes
+
+UPDATE_BATCH_SIZE = 500
+
+
+def bulk_insert(model, objects):
+    """
+    Insert the objects with bulk_create and return them with their ids set.
+
+    PostgreSQL returns the ids from the INSERT. Other databases read them back as
+    the highest ids right after it, so the caller must hold a transaction that keeps
+    other writers out, as SQLite does from its first write until the commit.
+    """
+    objects = model.objects.bulk_create(objects)
+    if objects and not connection.features.can_return_ids_from_bulk_insert:
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id']
+        for obj, id in zip(objects, range(last_id - len(objects) + 1, last_id + 1)):
+            obj.id = id
+            obj._state.adding = False
+    return objects
+
+
+def create_recipes(recipes):
+    """
+    Insert the recipes in one transaction, count and index them, and return them with their ids.
+
+    bulk_create sends no post_save, so this does what jedzonko.signals does for a
+    saved recipe once for the whole list.
+    """
+    recipes = list(recipes)
+    if not recipes:
+        return []
+    with transaction.atomic():
+        bulk_insert(Recipe, recipes)
+        add('recipe', len(recipes))
+        ids = [recipe.id for recipe in recipes]
+        index_recipe_range(min(ids), max(ids))
+        parsed = save_recipe_ingredients(recipes)
+        index_recipes(recipes, parsed)
+    return recipes
+
+
+class Command(BaseCommand):
+    """
+    Import recipes from a JSONL or CSV file written by export_recipes.
+
+    The file is read row by row and valid recipes are written with bulk_create,
+    one transaction per batch. After every committed batch the number of rows
+    read so far is stored in `<path>.progress`, and --resume continues from it
+    after a failure. Invalid rows are reported and skipped.
+
+    Example usage:
+    $ python manage.py import_recipes recipes.jsonl --batch-size 1000
+    $ python manage.py import_recipes recipes.jsonl --resume
+    """
+    help = "Import recipes from JSONL or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip the rows imported by a previous run of the same file.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = recipe_format(path, options['format'])
+        progress_path = path + '.progress'
+        done = 0
+        if options['resume'] and os.path.exists(progress_path):
+            with open(progress_path) as progress:
+                done = int(progress.read().strip() or 0)
+            self.stderr.write('Resuming after row %d' % done)
+
+        start = time.perf_counter()
+        imported = skipped = 0
+        with open(path, newline='', encoding='utf-8') as source:
+            rows = ((number, row) for number, row in self.read(source, format) if number > done)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                recipes = []
+                for line, row in batch:
+                    try:
+                        recipes.append(self.build(row))
+                    except (ValidationError, ValueError, TypeError) as error:
+                        skipped += 1
+                        self.stderr.write('Row %d skipped: %s' % (line, error))
+                self.save(recipes)
+                imported += len(recipes)
+                done = batch[-1][0]
+                with open(progress_path, 'w') as progress:
+                    progress.write(str(done))
+                self.stderr.write('%d recipes imported, %d rows read' % (imported, done))
+
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+        elapsed = time.perf_counter() - start
+        self.stdout.write('Imported %d recipes, skipped %d rows in %.1f s (%.0f recipes/s)'
+                          % (imported, skipped, elapsed, imported / elapsed if elapsed else 0))
+
+    def read(self, source, format):
+        """
+        Yield (row number, row) pairs of the file, numbered from 1.
+
+        A JSONL line that is not valid JSON is yielded as its text, so it is reported
+        as an invalid row instead of stopping the import.
+        """
+        if format == 'csv':
+            yield from enumerate(csv.DictReader(source), start=1)
+            return
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, line.strip()
+
+    def build(self, row):
+        """
+        Return an unsaved recipe built from the row, raising ValidationError or ValueError for an invalid row.
+        """
+        if not isinstance(row, dict):
+            raise ValueError("not a JSON object: %.60s" % row)
+        recipe = Recipe(**{field: row[field] for field in FIELDS if row.get(field) not in (None, '')})
+        recipe.full_clean(validate_unique=False)
+        return recipe
+
+    def save(self, recipes):
+        """
+        Insert the recipes in one transaction, index them and restore their exported update times.
+        """
+        # auto_now sets `updated` to the time of the insert.
+        updated = [recipe.updated for recipe in recipes]
+        with transaction.atomic():
+            create_recipes(recipes)
+            restored = [(recipe.id, time) for recipe, time in zip(recipes, updated) if time]
+            for start in range(0, len(restored), UPDATE_BATCH_SIZE):
+                batch = restored[start:start + UPDATE_BATCH_SIZE]
+                Recipe.objects.filter(id__in=[id for id, _ in batch]).update(updated=Case(
+                    *[When(id=id, then=Value(time)) for id, time in batch], output_field=DateTimeField()))
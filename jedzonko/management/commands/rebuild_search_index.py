@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jedzonko.search import rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full-text search index of all recipes.
+
+    Example usage:
+    $ python manage.py rebuild_search_index --batch-size 5000
+    """
+    help = "Rebuild the recipe full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write('Indexed %d recipes in %.1f s' % (indexed, time.perf_counter() - start))
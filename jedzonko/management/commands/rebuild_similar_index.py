@@ -0,0 +1,62 @@
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jedzonko.models import Recipe
+from jedzonko.similar import save_signatures, signatures
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the MinHash signatures and LSH buckets of all recipes.
+
+    Recipes are read in batches of primary keys. The signatures of each batch
+    are computed by a pool of worker processes, which do not use the database,
+    while the main process reads the next batches and writes the finished ones. The old index stays
+    usable while the rebuild runs.
+
+    Example usage:
+    $ python manage.py rebuild_similar_index --processes 4 --batch-size 2000
+    """
+    help = "Rebuild the similar recipes index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help="Worker processes, the number of CPUs by default.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        # Worker processes must not inherit open database connections.
+        connections.close_all()
+        indexed = 0
+        processes = options['processes'] or os.cpu_count()
+        with Pool(processes, initializer=django.setup) as pool:
+            # Batches are read and written here, in the main thread; the pool only computes.
+            pending = deque()
+            for batch in self.batches(options['batch_size']):
+                pending.append(([recipe_id for recipe_id, _ in batch], pool.apply_async(signatures, (batch,))))
+                if len(pending) > processes * 2:
+                    indexed += self.save(*pending.popleft())
+            while pending:
+                indexed += self.save(*pending.popleft())
+        self.stdout.write('Indexed %d recipes in %.1f s' % (indexed, time.perf_counter() - start))
+
+    def save(self, recipe_ids, result):
+        save_signatures(recipe_ids, result.get())
+        self.stderr.write('%d recipes up to id %d indexed' % (len(recipe_ids), recipe_ids[-1]))
+        return len(recipe_ids)
+
+    def batches(self, batch_size):
+        last_id = 0
+        while True:
+            batch = list(Recipe.objects.filter(id__gt=last_id).order_by('id')
+                         .values_list('id', 'ingredients')[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1][0]
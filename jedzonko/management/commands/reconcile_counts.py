@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jedzonko.counters import COUNTED, reconcile
+
+
+class Command(BaseCommand):
+    """
+    Count the recipes and plans again and correct the stored counters.
+
+    The counters are kept exact by signals and by the commands writing rows in
+    bulk; the command fixes any drift left by writes that bypass both, such as
+    raw SQL.
+
+    Example usage:
+    $ python manage.py reconcile_counts
+    $ python manage.py reconcile_counts recipe
+    """
+    help = "Correct the stored recipe and plan counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help="Counters to correct, all by default: %s." % ', '.join(sorted(COUNTED)))
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options['names'] if name not in COUNTED]
+        if unknown:
+            raise CommandError("Unknown counters: %s" % ', '.join(unknown))
+        for name, (count, previous) in reconcile(options['names']).items():
+            if previous is None:
+                self.stdout.write('%s: %d (created)' % (name, count))
+            elif previous != count:
+                self.stdout.write('%s: %d (was %d)' % (name, count, previous))
+            else:
+                self.stdout.write('%s: %d' % (name, count))
@@ -0,0 +1,82 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jedzonko.counters import add
+from jedzonko.management.commands.import_recipes import bulk_insert, create_recipes
+from jedzonko.models import DayName, Plan, Recipe, RecipePlan
+
+DISHES = ('Zupa', 'Sałatka', 'Zapiekanka', 'Placki', 'Gulasz', 'Makaron', 'Omlet', 'Kotlety', 'Risotto', 'Pierogi')
+FLAVOURS = ('pomidorowa', 'z kurczakiem', 'ze szpinakiem', 'z serem', 'z grzybami', 'warzywna', 'z tuńczykiem',
+            'z dynią', 'po włosku', 'babci')
+INGREDIENTS = ('200 g mąki', '2 jajka', '1 l mleka', '50 g masła', 'szczypta soli', '3 pomidory', '100 g sera',
+               '1 cebula', '2 ząbki czosnku', '250 ml śmietany', '300 g kurczaka', '1 łyżka oliwy',
+               '400 g makaronu', '150 g szpinaku', '1 puszka tuńczyka', '500 g dyni', '200 g pieczarek')
+MEALS = ('Śniadanie', 'Drugie śniadanie', 'Obiad', 'Podwieczorek', 'Kolacja')
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with synthetic recipes and meal plans.
+
+    The same --seed always produces the same recipes and plans, so data sets of a
+    given size can be recreated for benchmarks and performance tests. Rows are
+    written with bulk_create; the search index and the parsed
+    ingredients of the new recipes are filled in like import_recipes does, since
+    bulk_create sends no post_save signals. Every plan gets --meals meals spread
+    over the week.
+
+    Example usage:
+    $ python manage.py seed_data --recipes 10000 --plans 500 --meals 21 --seed 1
+    """
+    help = "Create N recipes, M plans and K meals per plan from a random seed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--plans', type=int, default=10)
+        parser.add_argument('--meals', type=int, default=21, help="Meals per plan.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            recipe_ids = self.create_recipes(rng, options['recipes'])
+            plans = self.create_plans(rng, options['plans'], options['meals'], recipe_ids)
+        self.stdout.write('Created %d recipes and %d plans with %d meals each'
+                          % (len(recipe_ids), plans, options['meals']))
+
+    def create_recipes(self, rng, count):
+        """
+        Insert the recipes, index them and return their ids.
+        """
+        created = create_recipes(
+            Recipe(name='%s %s %d' % (rng.choice(DISHES), rng.choice(FLAVOURS), number),
+                   ingredients=', '.join(rng.sample(INGREDIENTS, rng.randint(2, 6))),
+                   description='Przepis numer %d' % number,
+                   how_to_prepare='Wymieszać składniki. Gotować %d minut.' % rng.randint(5, 60),
+                   preparation_time=rng.randint(5, 120),
+                   vote=rng.randint(0, 50))
+            for number in range(1, count + 1)
+        )
+        return [recipe.id for recipe in created]
+
+    def create_plans(self, rng, count, meals, recipe_ids):
+        """
+        Insert the plans with their meals and return the number of plans.
+        """
+        if not recipe_ids:
+            meals = 0
+        plans = bulk_insert(Plan, [Plan(name='Plan %d' % number, description='Plan numer %d' % number)
+                                   for number in range(1, count + 1)])
+        plan_ids = [plan.id for plan in plans]
+        add('plan', len(plan_ids))
+        days = list(DayName)
+        RecipePlan.objects.bulk_create((
+            RecipePlan(plan_id=plan_id, recipe_id=rng.choice(recipe_ids),
+                       meal_name=MEALS[(number // len(days)) % len(MEALS)],
+                       meal_order=number // len(days) + 1,
+                       weekday=days[number % len(days)].weekday)
+            for plan_id in plan_ids for number in range(meals)
+        ))
+        return len(plan_ids)
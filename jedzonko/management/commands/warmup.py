@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from jedzonko.warmup import warmup
+
+
+class Command(BaseCommand):
+    """
+    Run the worker warm-up (see jedzonko.warmup) and report what each step did.
+
+    Example usage:
+    $ python manage.py warmup --databases
+    templates     21 in    34.1 ms
+    urls          53 in     4.0 ms
+    databases      1 in     2.2 ms
+    """
+    help = "Compile the templates and URL patterns, and open the database connections with --databases."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--databases', action='store_true',
+                            help="Open the database connections even when WARMUP_DATABASES is off.")
+
+    def handle(self, *args, **options):
+        for step, count, seconds in warmup(databases=options['databases'] or None):
+            self.stdout.write('%-10s %5d in %7.1f ms' % (step, count, seconds * 1000))
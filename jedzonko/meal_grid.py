@@ -0,0 +1,118 @@
+"""
+Adding many meals to a plan at once, like filling a whole week.
+
+A grid is a list of cells, each a dict with the day (a weekday number from 0
+for Monday, or a DayName key like 'MON'), the meal order, an optional meal
+name and the recipe id. All recipe ids are checked with one query and all
+meals are written with one bulk insert in a transaction. A grid with any
+invalid cell is not written at all; MealGridError lists the errors by cell.
+"""
+from django.db import transaction
+
+from jedzonko.models import DayName, Plan, Recipe, RecipePlan, meal_name
+from jedzonko.versions import bump_plan_versions
+
+MAX_CELLS = 7 * 10
+MEAL_NAME_LENGTH = RecipePlan._meta.get_field('meal_name').max_length
+
+
+class MealGridError(ValueError):
+    """
+    Error of a grid that cannot be added.
+
+    Attributes:
+    - errors (dict): Cell index -> {field: message}; the key None holds an error of the whole grid.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(' '.join(self.messages()))
+
+    def messages(self):
+        return [message for errors in self.errors.values()
+                for message in (errors.values() if isinstance(errors, dict) else [errors])]
+
+
+def parse_day(value):
+    """
+    Return the weekday number of a weekday number or DayName key, or None.
+    """
+    if isinstance(value, str):
+        if value.upper() in DayName.__members__:
+            return DayName[value.upper()].weekday
+        if not value.strip().isdigit():
+            return None
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < len(DayName):
+        return value
+    return None
+
+
+def parse_int(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def add_meals(plan_id, cells):
+    """
+    Validate the cells and add them to the plan as meals, returning the new RecipePlan objects.
+
+    Raises MealGridError when the plan does not exist or any cell is invalid, with nothing written.
+
+    Example usage:
+    >>> add_meals(plan.id, [{'day': 'MON', 'order': 1, 'recipe_id': 12},
+    ...                     {'day': 0, 'order': 2, 'meal_name': 'Lunch', 'recipe_id': 40}])
+    [<RecipePlan: Weekly Plan>, <RecipePlan: Weekly Plan>]
+    """
+    if not isinstance(cells, list) or not cells:
+        raise MealGridError({None: "Podaj listę posiłków"})
+    if len(cells) > MAX_CELLS:
+        raise MealGridError({None: "Można dodać najwyżej %d posiłków naraz" % MAX_CELLS})
+
+    errors = {}
+    parsed = []
+    taken = set()
+    for index, cell in enumerate(cells):
+        cell = cell if isinstance(cell, dict) else {}
+        cell_errors = {}
+        weekday = parse_day(cell.get('day'))
+        if weekday is None:
+            cell_errors['day'] = "Podaj dzień tygodnia od 0 (poniedziałek) do 6 (niedziela)"
+        order = parse_int(cell.get('order'))
+        if order is None or order < 1:
+            cell_errors['order'] = "Podaj numer posiłku większy od zera"
+        elif weekday is not None:
+            if (weekday, order) in taken:
+                cell_errors['order'] = "Posiłek %d w dniu %s występuje już w tabeli" % (
+                    order, DayName.from_weekday(weekday).display_name())
+            taken.add((weekday, order))
+        name = cell.get('meal_name') or (meal_name(order) if order and order > 0 else '')
+        if not isinstance(name, str) or len(name) > MEAL_NAME_LENGTH:
+            cell_errors['meal_name'] = "Nazwa posiłku może mieć najwyżej %d znaków" % MEAL_NAME_LENGTH
+        recipe_id = parse_int(cell.get('recipe_id'))
+        if recipe_id is None:
+            cell_errors['recipe_id'] = "Podaj id przepisu"
+        if cell_errors:
+            errors[index] = cell_errors
+        parsed.append((weekday, order, name, recipe_id))
+
+    recipes = Recipe.objects.only('id').in_bulk({recipe_id for _, _, _, recipe_id in parsed if recipe_id is not None})
+    for index, (_, _, _, recipe_id) in enumerate(parsed):
+        if recipe_id is not None and recipe_id not in recipes:
+            errors.setdefault(index, {})['recipe_id'] = "Nie ma przepisu %d" % recipe_id
+    if errors:
+        raise MealGridError(errors)
+
+    with transaction.atomic():
+        # The plan row stays locked until the meals referencing it are written.
+        if not Plan.objects.select_for_update().filter(id=plan_id).exists():
+            raise MealGridError({None: "Nie ma planu %s" % plan_id})
+        meals = RecipePlan.objects.bulk_create([
+            RecipePlan(plan_id=plan_id, recipe_id=recipe_id, meal_name=name, meal_order=order, weekday=weekday)
+            for weekday, order, name, recipe_id in parsed
+        ])
+        bump_plan_versions([plan_id])
+    return meals
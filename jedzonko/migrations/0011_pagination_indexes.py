@@ -0,0 +1,21 @@
+# Generated by Django 2.2.6 on 2026-10-17 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jedzonko', '0010_recipe_how_to_prepare'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['name', 'id'], name='plan_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-vote', '-created', '-id'], name='recipe_vote_created_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(ingredients, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE jedzonko_recipe ADD COLUMN search_vector tsvector")
+        schema_editor.execute("UPDATE jedzonko_recipe SET search_vector = " + POSTGRES_VECTOR)
+        schema_editor.execute("CREATE INDEX jedzonko_recipe_search_idx ON jedzonko_recipe USING GIN (search_vector)")
+    elif vendor == 'sqlite':
+        schema_editor.execute("CREATE VIRTUAL TABLE jedzonko_recipe_fts USING fts5(name, ingredients, description)")
+        schema_editor.execute("INSERT INTO jedzonko_recipe_fts (rowid, name, ingredients, description) "
+                              "SELECT id, name, ingredients, description FROM jedzonko_recipe")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX jedzonko_recipe_search_idx")
+        schema_editor.execute("ALTER TABLE jedzonko_recipe DROP COLUMN search_vector")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE jedzonko_recipe_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jedzonko', '0011_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
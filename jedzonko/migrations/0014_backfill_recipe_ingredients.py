@@ -0,0 +1,142 @@
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# A frozen copy of jedzonko.ingredients.parse_ingredients, so later changes to the
+# parser do not change what this migration writes.
+ParsedIngredient = namedtuple('ParsedIngredient', ['name', 'quantity', 'unit'])
+
+UNITS = {
+    'g': 'g', 'gr': 'g', 'gram': 'g', 'gramy': 'g', 'gramów': 'g',
+    'dag': 'dag', 'dkg': 'dag',
+    'kg': 'kg', 'kilogram': 'kg', 'kilogramy': 'kg',
+    'ml': 'ml', 'l': 'l', 'litr': 'l', 'litry': 'l', 'litrów': 'l',
+    'szt': 'szt', 'sztuka': 'szt', 'sztuki': 'szt', 'sztuk': 'szt',
+    'łyżka': 'łyżka', 'łyżki': 'łyżka', 'łyżek': 'łyżka',
+    'łyżeczka': 'łyżeczka', 'łyżeczki': 'łyżeczka', 'łyżeczek': 'łyżeczka',
+    'szklanka': 'szklanka', 'szklanki': 'szklanka', 'szklanek': 'szklanka',
+    'szczypta': 'szczypta', 'szczypty': 'szczypta',
+    'ząbek': 'ząbek', 'ząbki': 'ząbek', 'ząbków': 'ząbek',
+    'opakowanie': 'opakowanie', 'opakowania': 'opakowanie', 'opak': 'opakowanie',
+    'plaster': 'plaster', 'plastry': 'plaster', 'plastrów': 'plaster',
+    'pęczek': 'pęczek', 'pęczki': 'pęczek',
+    'puszka': 'puszka', 'puszki': 'puszka',
+    'cup': 'cup', 'cups': 'cup', 'tbsp': 'tbsp', 'tsp': 'tsp', 'oz': 'oz', 'lb': 'lb',
+    'pcs': 'szt', 'pc': 'szt',
+}
+
+# RecipeIngredient.quantity is a DecimalField(max_digits=10, decimal_places=3).
+MAX_QUANTITY = Decimal(10) ** 7
+
+FRACTIONS = {'½': '1/2', '¼': '1/4', '¾': '3/4', '⅓': '1/3', '⅔': '2/3'}
+
+# A comma followed by a digit is a decimal comma ("0,5 kg"), not a separator.
+SEPARATOR = re.compile(r'[\n;]|,(?!\d)')
+NUMBER = r'\d+(?:[.,]\d+)?(?:/\d+)?'
+# A range ("3-4 jajka") is stored as its upper bound, so a shopping list has enough.
+QUANTITY = r'(?P<quantity>(?:\d+\s+)?' + NUMBER + r')(?:\s*[-–]\s*(?P<upper>' + NUMBER + r'))?'
+LEADING = re.compile(r'^' + QUANTITY + r'\s*(?P<rest>.*)$')
+TRAILING = re.compile(r'^(?P<name>.+?)[\s:(\-–]+' + QUANTITY + r'\s*(?P<unit>[^\W\d]+)?\.?\)?$')
+
+
+def parse_quantity(text):
+    try:
+        total = Decimal(0)
+        for part in text.replace(',', '.').split():
+            numerator, _, denominator = part.partition('/')
+            total += Decimal(numerator) / Decimal(denominator) if denominator else Decimal(numerator)
+        total = total.quantize(Decimal('0.001'))
+    except (InvalidOperation, ZeroDivisionError):
+        return None
+    return total if total < MAX_QUANTITY else None
+
+
+def match_quantity(match):
+    quantity = parse_quantity(match.group('quantity'))
+    if match.group('upper') is not None:
+        upper = parse_quantity(match.group('upper'))
+        quantity = max(quantity, upper) if quantity is not None and upper is not None else None
+    return quantity
+
+
+def normalize_name(name):
+    return ' '.join(name.strip(' \t.,:;-–*•()').lower().split())[:255]
+
+
+def parse_ingredients(text):
+    items = []
+    for part in SEPARATOR.split(text or ''):
+        part = part.strip(' \t\r-*•')
+        for symbol, fraction in FRACTIONS.items():
+            part = part.replace(symbol, ' ' + fraction)
+        part = part.strip()
+        if not part:
+            continue
+
+        name, quantity, unit = part, None, ''
+        leading = LEADING.match(part)
+        trailing = TRAILING.match(part)
+        if leading:
+            quantity = match_quantity(leading)
+            name = leading.group('rest')
+            first, _, rest = name.partition(' ')
+            if first.rstrip('.').lower() in UNITS and rest:
+                unit, name = UNITS[first.rstrip('.').lower()], rest
+        elif trailing and (trailing.group('unit') or '').lower() in UNITS.keys() | {''}:
+            name = trailing.group('name')
+            quantity = match_quantity(trailing)
+            unit = UNITS.get((trailing.group('unit') or '').lower(), '')
+
+        name = normalize_name(name)
+        if name:
+            items.append(ParsedIngredient(name, quantity, unit))
+    return items
+
+
+def backfill_recipe_ingredients(apps, schema_editor):
+    Recipe = apps.get_model('jedzonko', 'Recipe')
+    Ingredient = apps.get_model('jedzonko', 'Ingredient')
+    RecipeIngredient = apps.get_model('jedzonko', 'RecipeIngredient')
+
+    last_id = 0
+    while True:
+        batch = list(Recipe.objects.filter(id__gt=last_id).order_by('id').only('id', 'ingredients')[:BATCH_SIZE])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        parsed = {recipe.id: parse_ingredients(recipe.ingredients) for recipe in batch}
+        names = sorted({item.name for items in parsed.values() for item in items})
+
+        ingredients = {}
+        for start in range(0, len(names), BATCH_SIZE):
+            chunk = names[start:start + BATCH_SIZE]
+            ingredients.update(Ingredient.objects.filter(name__in=chunk).values_list('name', 'id'))
+            Ingredient.objects.bulk_create([Ingredient(name=name) for name in chunk if name not in ingredients])
+            ingredients.update(Ingredient.objects.filter(name__in=chunk).values_list('name', 'id'))
+
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredients[item.name],
+                             quantity=item.quantity, unit=item.unit, position=position)
+            for recipe_id, items in parsed.items()
+            for position, item in enumerate(items)
+        ])
+
+
+def clear_recipe_ingredients(apps, schema_editor):
+    apps.get_model('jedzonko', 'RecipeIngredient').objects.all().delete()
+    apps.get_model('jedzonko', 'Ingredient').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jedzonko', '0013_ingredient_recipeingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_recipe_ingredients, clear_recipe_ingredients),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.6 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jedzonko', '0014_backfill_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['created'], name='plan_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeplan',
+            index=models.Index(fields=['plan', 'day_name', 'meal_order'], name='recipeplan_plan_day_idx'),
+        ),
+    ]
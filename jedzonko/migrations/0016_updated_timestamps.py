@@ -0,0 +1,24 @@
+# Generated by Django 2.2.6 on 2026-10-17 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jedzonko', '0015_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunSQL("UPDATE jedzonko_plan SET updated = created", migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='recipe',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
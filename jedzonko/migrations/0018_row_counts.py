@@ -0,0 +1,27 @@
+# Generated by Django 2.2.6 on 2026-10-17 04:38
+
+from django.db import migrations, models
+
+
+def count_rows(apps, schema_editor):
+    RowCount = apps.get_model('jedzonko', 'RowCount')
+    for name in ('recipe', 'plan'):
+        RowCount.objects.create(name=name, count=apps.get_model('jedzonko', name).objects.count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jedzonko', '0017_recipe_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RowCount',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.6 on 2026-10-17 05:02
+
+from django.db import migrations, models
+from django.db.models import Case, Max, Value, When
+
+BATCH_SIZE = 5000
+# Rows were written with both the choice keys and the display names of the days.
+DAYS = (
+    ('MON', 'Poniedziałek'),
+    ('TUE', 'Wtorek'),
+    ('WED', 'Środa'),
+    ('THU', 'Czwartek'),
+    ('FRI', 'Piątek'),
+    ('SAT', 'Sobota'),
+    ('SUN', 'Niedziela'),
+)
+
+
+def _batches(RecipePlan):
+    last_id = RecipePlan.objects.aggregate(last=Max('id'))['last'] or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        yield RecipePlan.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE)
+
+
+def day_name_to_weekday(apps, schema_editor):
+    # Values that are not a day fall back to Monday, the old default.
+    weekday = Case(*[When(day_name__in=names, then=Value(number)) for number, names in enumerate(DAYS)],
+                   default=Value(0), output_field=models.PositiveSmallIntegerField())
+    for batch in _batches(apps.get_model('jedzonko', 'RecipePlan')):
+        batch.update(weekday=weekday)
+
+
+def weekday_to_day_name(apps, schema_editor):
+    day_name = Case(*[When(weekday=number, then=Value(names[1])) for number, names in enumerate(DAYS)],
+                    default=Value(DAYS[0][1]), output_field=models.CharField())
+    for batch in _batches(apps.get_model('jedzonko', 'RecipePlan')):
+        batch.update(day_name=day_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jedzonko', '0018_row_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeplan',
+            name='weekday',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Poniedziałek'), (1, 'Wtorek'), (2, 'Środa'), (3, 'Czwartek'), (4, 'Piątek'), (5, 'Sobota'), (6, 'Niedziela')], default=0),
+        ),
+        migrations.RunPython(day_name_to_weekday, weekday_to_day_name),
+        migrations.RemoveIndex(
+            model_name='recipeplan',
+            name='recipeplan_plan_day_idx',
+        ),
+        migrations.RemoveField(
+            model_name='recipeplan',
+            name='day_name',
+        ),
+        migrations.AddIndex(
+            model_name='recipeplan',
+            index=models.Index(fields=['plan', 'weekday', 'meal_order'], name='recipeplan_weekday_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeplan',
+            constraint=models.CheckConstraint(check=models.Q(weekday__lte=6), name='recipeplan_weekday_range'),
+        ),
+    ]
@@ -1,11 +1,70 @@
+import random
+
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Max, Min
 from enum import Enum
 from django.utils.text import slugify
 
 
 # Create your models here.
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    QuerySet for the Recipe model.
+
+    Methods:
+    - sample(size, attempts=3): Method returning up to `size` random recipes.
+    - with_ingredient(name): Method returning the recipes containing the ingredient.
+    """
+    def with_ingredient(self, name):
+        """
+        Return the recipes containing the ingredient, looked up by its indexed name.
+
+        Example usage:
+        >>> Recipe.objects.with_ingredient('Mąka')
+        """
+        name = ' '.join(name.lower().split())
+        return self.filter(id__in=RecipeIngredient.objects.filter(ingredient__name=name).values('recipe_id'))
+
+    def sample(self, size, attempts=3):
+        """
+        Return up to `size` random recipes without loading the whole table.
+
+        Random ids are drawn from the primary key range and fetched with an indexed
+        IN lookup, so the cost depends on the sample size rather than the number of
+        recipes. Ids missing because of deleted rows are redrawn a few times, and
+        whatever is still missing is taken from the rows following a random id.
+
+        Example usage:
+        >>> Recipe.objects.only('name', 'description').sample(3)
+        """
+        bounds = self.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['high'] is None:
+            return []
+        ids = range(bounds['low'], bounds['high'] + 1)
+        found = {}
+        for _ in range(attempts):
+            missing = size - len(found)
+            candidates = [pk for pk in random.sample(ids, min(len(ids), missing * 2)) if pk not in found]
+            for recipe in self.filter(id__in=candidates):
+                if len(found) < size:
+                    found[recipe.id] = recipe
+            if len(found) >= size or len(ids) <= missing * 2:
+                break
+        else:
+            start = random.choice(ids)
+            for rest in (self.filter(id__gte=start), self.filter(id__lt=start)):
+                missing = size - len(found)
+                if missing <= 0:
+                    break
+                for recipe in rest.exclude(id__in=list(found)).order_by('id')[:missing]:
+                    found[recipe.id] = recipe
+        sample = list(found.values())
+        random.shuffle(sample)
+        return sample
+
+
 class Recipe(models.Model):
     """
     Model representing a recipe.
@@ -15,7 +74,7 @@ class Recipe(models.Model):
     - ingredients (TextField): Ingredients needed for the recipe.
     - description (TextField): Description of the recipe.
     - created (DateTimeField): Date and time when the recipe was created.
-    - updated (DateTimeField): Date and time when the recipe was last updated.
+    - updated (DateTimeField): Date and time when the recipe or its votes were last updated.
     - preparation_time (IntegerField): Time required to prepare the recipe.
     - vote (IntegerField): Number of votes received for the recipe.
     - how_to_prepare (TextField): Instructions on how to prepare the recipe.
@@ -28,11 +87,99 @@ class Recipe(models.Model):
     ingredients = models.TextField()
     description = models.TextField()
     created = models.DateTimeField(default=timezone.now, editable=False)
-    updated = models.DateTimeField(default=timezone.now, editable=False)
+    updated = models.DateTimeField(auto_now=True)
     preparation_time = models.IntegerField()
     vote = models.IntegerField(default=0)
     how_to_prepare = models.TextField(default="I don't know how to prepare it")
 
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-vote', '-created', '-id'], name='recipe_vote_created_idx'),
+        ]
+
+
+class Ingredient(models.Model):
+    """
+    Model representing an ingredient used in recipes.
+
+    Attributes:
+    - name (CharField): The normalized, lowercase name of the ingredient, unique.
+
+    Example usage:
+    >>> ingredient = Ingredient(name='mąka')
+    >>> ingredient.save()
+    >>> print(ingredient)
+    mąka
+    """
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """
+    Model representing an ingredient of a recipe, parsed from Recipe.ingredients.
+
+    Attributes:
+    - recipe (ForeignKey): Foreign key to the Recipe model, specifying the recipe.
+    - ingredient (ForeignKey): Foreign key to the Ingredient model, specifying the ingredient.
+    - quantity (DecimalField): Amount of the ingredient, empty if the text gives none.
+    - unit (CharField): Normalized unit of the quantity, empty for countable ingredients.
+    - position (IntegerField): Position of the ingredient in the recipe text.
+
+    Example usage:
+    >>> recipe = Recipe.objects.get(name='Spaghetti Bolognese')
+    >>> recipe_ingredient = RecipeIngredient(recipe=recipe, ingredient=Ingredient.objects.get(name='pasta'),
+    ...                                      quantity=500, unit='g')
+    >>> recipe_ingredient.save()
+    """
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='recipe_ingredients')
+    quantity = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
+    position = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ingredient', 'recipe'], name='recipeingredient_ingr_idx'),
+        ]
+
+
+class RecipeSignature(models.Model):
+    """
+    Model representing the MinHash signature of a recipe's ingredient names, see jedzonko.similar.
+
+    Attributes:
+    - recipe (OneToOneField): The recipe, also the primary key.
+    - minhash (BinaryField): The signature, jedzonko.similar.NUM_HASHES unsigned 32-bit integers.
+    """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField()
+
+
+class RecipeBand(models.Model):
+    """
+    Model representing the LSH bucket a recipe falls into in one band of its MinHash signature.
+
+    Recipes sharing a bucket in any band are candidates for similar recipes.
+
+    Attributes:
+    - recipe (ForeignKey): Foreign key to the Recipe model.
+    - band (PositiveSmallIntegerField): Number of the band.
+    - bucket (BigIntegerField): Hash of the signature values in the band.
+    """
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='recipeband_bucket_idx'),
+        ]
+
 
 class Plan(models.Model):
     """
@@ -43,9 +190,12 @@ class Plan(models.Model):
     - name (CharField): The name of the meal plan.
     - description (TextField): Description of the meal plan.
     - created (DateTimeField): Date and time when the meal plan was created.
+    - updated (DateTimeField): Date and time when the meal plan, its meals or their recipes were last updated.
 
     Methods:
     - __str__(): Method returning a readable representation of the object.
+    - week(): Method returning the meals of the plan grouped by day, in week order.
+    - clone(name=None, shift_days=0, day_map=None): Method copying the plan with all its meals.
 
     Example usage:
     >>> plan = Plan(name='Weekly Plan', description='A plan for the entire week')
@@ -57,14 +207,70 @@ class Plan(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     created = models.DateTimeField(default=timezone.now, editable=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='plan_name_idx'),
+            models.Index(fields=['created'], name='plan_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def week(self):
+        """
+        Load all meals of the plan with one query and group them by day.
+
+        Returns a list of (day, meals) pairs ordered Monday to Sunday, where meals
+        is a list of RecipePlan objects ordered by meal_order with their recipe
+        already joined, so rendering the week does not hit the database again.
+        """
+        days = [(day.value, []) for day in DayName]
+        meals = RecipePlan.objects.filter(plan=self).select_related('recipe').order_by('weekday', 'meal_order')
+        for meal in meals:
+            days[meal.weekday][1].append(meal)
+        return days
+
+    def clone(self, name=None, shift_days=0, day_map=None):
+        """
+        Copy the plan and all its meals in one transaction and return the new plan.
+
+        The meals are read with one query and written with one bulk insert. With
+        shift_days every meal moves that many days forward, wrapping around the
+        week (Sunday + 1 is Monday); day_map maps DayName members to the days their
+        meals should move to and is applied after the shift.
+
+        Example usage:
+        >>> plan = Plan.objects.get(name='Weekly Plan')
+        >>> plan.clone(name='Next week', day_map={DayName.SAT: DayName.SUN})
+        <Plan: Next week>
+        """
+        from jedzonko.versions import bump_plan_versions  # jedzonko.versions imports the models.
+
+        day_map = day_map or {}
+        moves = []
+        for day in DayName:
+            shifted = DayName.from_weekday((day.weekday + shift_days) % len(DayName))
+            moves.append(day_map.get(shifted, shifted).weekday)
+
+        with transaction.atomic():
+            plan = Plan.objects.create(name=name or self.name, description=self.description)
+            meals = RecipePlan.objects.filter(plan=self).values_list('recipe_id', 'meal_name', 'meal_order', 'weekday')
+            RecipePlan.objects.bulk_create([
+                RecipePlan(plan=plan, recipe_id=recipe_id, meal_name=meal_name, meal_order=meal_order,
+                           weekday=moves[weekday])
+                for recipe_id, meal_name, meal_order, weekday in meals
+            ])
+            bump_plan_versions([plan.id])
+        return plan
+
 
 class DayName(Enum):
     """
-    Enum representing the names of days in a week.
+    Enum representing the names of days in a week, in week order from Monday.
+
+    RecipePlan stores a day as its weekday number; the name is only looked up for display.
     """
     MON = 'Poniedziałek'
     TUE = 'Wtorek'
@@ -85,6 +291,29 @@ class DayName(Enum):
             self.SUN: 'Niedziela',
         }[self]
 
+    @property
+    def weekday(self):
+        """
+        Number of the day in the week, 0 for Monday to 6 for Sunday.
+        """
+        return _WEEKDAYS.index(self)
+
+    @classmethod
+    def from_weekday(cls, weekday):
+        return _WEEKDAYS[weekday]
+
+
+_WEEKDAYS = list(DayName)
+
+MEAL_NAMES = ('Śniadanie', 'Drugie śniadanie', 'Obiad', 'Podwieczorek', 'Kolacja')
+
+
+def meal_name(order):
+    """
+    Default name of the meal at the given order in a day, counted from 1.
+    """
+    return MEAL_NAMES[order - 1] if order <= len(MEAL_NAMES) else 'Posiłek %d' % order
+
 
 class RecipePlan(models.Model):
     """
@@ -95,7 +324,8 @@ class RecipePlan(models.Model):
     - plan (ForeignKey): Foreign key to the Plan model, specifying the meal plan.
     - meal_name (CharField): Name of the meal in the plan.
     - meal_order (IntegerField): Order of the meal in the plan.
-    - day_name (CharField): Name of the day the meal is planned, with choices from DayName enum.
+    - weekday (PositiveSmallIntegerField): Day the meal is planned, 0 for Monday to 6 for Sunday,
+      displayed with the DayName values.
 
     Methods:
     - __str__(): Method returning a readable representation of the object.
@@ -103,7 +333,8 @@ class RecipePlan(models.Model):
     Example usage:
     >>> recipe = Recipe.objects.get(name='Spaghetti Bolognese')
     >>> plan = Plan.objects.get(name='Weekly Plan')
-    >>> recipe_plan = RecipePlan(recipe=recipe, plan=plan, meal_name='Dinner', meal_order=1, day_name=DayName.MON)
+    >>> recipe_plan = RecipePlan(recipe=recipe, plan=plan, meal_name='Dinner', meal_order=1,
+    ...                          weekday=DayName.MON.weekday)
     >>> recipe_plan.save()
     >>> print(recipe_plan)
     Weekly Plan
@@ -112,10 +343,17 @@ class RecipePlan(models.Model):
     plan = models.ForeignKey(Plan, on_delete=models.CASCADE)
     meal_name = models.CharField(max_length=255)
     meal_order = models.IntegerField()
-    day_name = models.CharField(
-        max_length=20,
-        choices=[(day.name, day.value) for day in DayName],
-        default=DayName.MON.value)
+    weekday = models.PositiveSmallIntegerField(
+        choices=[(day.weekday, day.value) for day in DayName],
+        default=DayName.MON.weekday)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['plan', 'weekday', 'meal_order'], name='recipeplan_weekday_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(weekday__lte=6), name='recipeplan_weekday_range'),
+        ]
 
     def __str__(self):
         return self.plan.name
@@ -150,3 +388,15 @@ class Page(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class RowCount(models.Model):
+    """
+    Model representing the number of rows of a table, kept exact by jedzonko.counters.
+
+    Attributes:
+    - name (CharField): Name of the counted model, e.g. 'recipe'.
+    - count (BigIntegerField): Number of rows.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    count = models.BigIntegerField(default=0)
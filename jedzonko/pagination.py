@@ -0,0 +1,133 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPage:
+    """
+    One page of objects returned by CursorPaginator.
+
+    Attributes:
+    - object_list (list): Objects on the page, in the paginator's ordering.
+    - has_next (bool): Whether there are objects after the page.
+    - has_previous (bool): Whether there are objects before the page.
+    - next_cursor (str): Cursor of the page after this one.
+    - previous_cursor (str): Cursor of the page before this one.
+    - last_cursor (str): Cursor of the last page.
+    """
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        return self.paginator.encode(NEXT, self.object_list[-1]) if self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.encode(PREVIOUS, self.object_list[0]) if self.object_list else None
+
+    @property
+    def last_cursor(self):
+        return self.paginator.encode(PREVIOUS)
+
+
+class CursorPaginator:
+    """
+    Paginator walking a queryset with opaque cursors instead of page numbers.
+
+    A cursor holds the ordering values of the first or last object of a page, and
+    the next page is fetched with a `WHERE (ordering) > (values)` condition instead
+    of an OFFSET. With an index matching the ordering every page costs the same,
+    however deep it is, and no COUNT(*) is needed to build the navigation. The
+    ordering must end with a unique field, so that no two objects share a cursor.
+
+    Example usage:
+    >>> paginator = CursorPaginator(Recipe.objects.all(), 50, ('-vote', '-created', '-id'))
+    >>> page = paginator.page(request.GET.get('cursor'))
+    >>> paginator.page(page.next_cursor)
+    """
+    def __init__(self, object_list, per_page, ordering):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def page(self, cursor=None):
+        """
+        Return the page the cursor points to, or the first page for a missing or invalid cursor.
+        """
+        direction, values = self.decode(cursor)
+        ordering = self.ordering
+        if direction == PREVIOUS:
+            ordering = [name[1:] if name.startswith('-') else '-' + name for name in ordering]
+
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+        object_list = list(queryset[:self.per_page + 1])
+        more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if direction == PREVIOUS:
+            object_list.reverse()
+            return CursorPage(object_list, self, has_next=values is not None, has_previous=more)
+        return CursorPage(object_list, self, has_next=more, has_previous=values is not None)
+
+    def encode(self, direction, obj=None):
+        values = None
+        if obj is not None:
+            values = [self._field(name).value_to_string(obj) for name in self.fields]
+        data = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode(self, cursor):
+        if not cursor:
+            return NEXT, None
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(data.decode())
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError(direction)
+            if values is not None:
+                if not isinstance(values, list) or len(values) != len(self.fields):
+                    raise ValueError(values)
+                values = [self._field(name).to_python(value) for name, value in zip(self.fields, values)]
+                # to_python() passes None through, and no lookup accepts it.
+                if None in values:
+                    raise ValueError(values)
+        except (ValueError, TypeError, ValidationError):
+            return NEXT, None
+        return direction, values
+
+    def _field(self, name):
+        return self.object_list.model._meta.get_field(name)
+
+    def _after(self, ordering, values):
+        """
+        Build the condition selecting the objects that follow `values` in `ordering`.
+
+        The expanded row comparison is prefixed with a plain range condition on the
+        first field, so the database can start an index range scan from it.
+        """
+        lookups = ['%s__%s' % (name.lstrip('-'), 'lt' if name.startswith('-') else 'gt') for name in ordering]
+        condition = Q()
+        for index, lookup in enumerate(lookups):
+            equal = dict(zip(self.fields[:index], values[:index]))
+            equal[lookup] = values[index]
+            condition |= Q(**equal)
+        return Q(**{lookups[0] + 'e': values[0]}) & condition
+
@@ -0,0 +1,153 @@
+"""
+iCalendar and CSV exports of a meal plan.
+
+The meals of a plan are read with one query joined with their recipes and turned
+into text row by row while the response streams. The complete text is cached
+under the plan version once the last row is written, so calendar apps polling a
+plan that has not changed get the cached text without reading the meals.
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from jedzonko.models import DayName, RecipePlan
+from jedzonko.versions import get_version
+
+CACHE_KEY = 'plan-export:%s:%s:%s'
+CONTENT_TYPES = {
+    'ics': 'text/calendar; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+CSV_FIELDS = ('day_name', 'meal_order', 'meal_name', 'recipe_id', 'recipe_name', 'preparation_time')
+# Meals of a day start at FIRST_MEAL and follow each other every MEAL_INTERVAL.
+FIRST_MEAL = time(8)
+MEAL_INTERVAL = timedelta(hours=3)
+DEFAULT_DURATION = 30
+
+
+def plan_meals(plan):
+    """
+    Yield the meals of the plan as dicts, in week order and by meal_order, read with one joined query.
+    """
+    return (RecipePlan.objects
+            .filter(plan_id=plan.id)
+            .order_by('weekday', 'meal_order', 'id')
+            .values('id', 'weekday', 'meal_order', 'meal_name', 'recipe_id',
+                    'recipe__name', 'recipe__description', 'recipe__preparation_time')
+            .iterator(chunk_size=500))
+
+
+class _Echo:
+    """
+    File-like object returning what is written to it, so csv.writer can produce one row at a time.
+    """
+    def write(self, value):
+        return value
+
+
+def plan_csv(plan, meals):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for meal in meals:
+        yield writer.writerow([DayName.from_weekday(meal['weekday']).value, meal['meal_order'], meal['meal_name'],
+                               meal['recipe_id'], meal['recipe__name'], meal['recipe__preparation_time']])
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,') \
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _fold(line):
+    """
+    Split a content line into lines of at most 75 octets, as RFC 5545 requires.
+    """
+    parts = []
+    part = ''
+    for char in line:
+        if len((part + char).encode()) > (75 if not parts else 74):
+            parts.append(part)
+            part = ''
+        part += char
+    parts.append(part)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _lines(*lines):
+    return ''.join(_fold(line) for line in lines)
+
+
+def _stamp(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _utc_stamp(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return _stamp(value.astimezone(timezone.utc)) + 'Z'
+
+
+def plan_ics(plan, meals):
+    """
+    Yield a calendar with one weekly recurring event per meal, starting in the week the plan was created.
+
+    Meals of a day follow each other in meal_order, and an event lasts as long as
+    the recipe takes to prepare.
+    """
+    monday = plan.created.date() - timedelta(days=plan.created.weekday())
+    dtstamp = _utc_stamp(plan.updated)
+    yield _lines('BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Jedzonko//Plan//PL', 'CALSCALE:GREGORIAN',
+                 'X-WR-CALNAME:' + _escape(plan.name))
+    day = position = None
+    for meal in meals:
+        position = position + 1 if meal['weekday'] == day else 0
+        day = meal['weekday']
+        start = datetime.combine(monday + timedelta(days=day), FIRST_MEAL) + MEAL_INTERVAL * position
+        yield _lines(
+            'BEGIN:VEVENT',
+            'UID:recipeplan-%s@jedzonko' % meal['id'],
+            'DTSTAMP:' + dtstamp,
+            'DTSTART:' + _stamp(start),
+            'DURATION:PT%sM' % (meal['recipe__preparation_time'] or DEFAULT_DURATION),
+            'RRULE:FREQ=WEEKLY',
+            'SUMMARY:' + _escape('%s: %s' % (meal['meal_name'], meal['recipe__name'])),
+            'DESCRIPTION:' + _escape(meal['recipe__description']),
+            'END:VEVENT',
+        )
+    yield _lines('END:VCALENDAR')
+
+
+WRITERS = {
+    'ics': plan_ics,
+    'csv': plan_csv,
+}
+
+
+def _cache_when_done(key, chunks):
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def export_plan(plan, format):
+    """
+    Return an iterator over the text of the plan exported in the format ('ics' or 'csv').
+
+    The cached text is returned as one chunk; otherwise the meals are read and the
+    text is generated while the caller iterates, and cached when the iteration
+    completes.
+
+    Example usage:
+    >>> ''.join(export_plan(Plan.objects.get(id=12), 'csv'))
+    'day_name,meal_order,meal_name,recipe_id,recipe_name,preparation_time\\r\\nPoniedziałek,1,Śniadanie,...'
+    """
+    key = CACHE_KEY % (plan.id, get_version('plan', plan.id), format)
+    text = cache.get(key)
+    if text is not None:
+        return iter([text])
+    return _cache_when_done(key, WRITERS[format](plan, plan_meals(plan)))
@@ -0,0 +1,165 @@
+"""
+Generation of weekly meal plans from the recipe catalog.
+
+The catalog is loaded into a RecipeIndex of (id, preparation time, votes)
+bucketed by preparation time and kept in process memory for
+settings.PLAN_GENERATOR_INDEX_TIMEOUT seconds, so generating a plan reads no
+recipes from the database. The index can be a little behind the catalog: new
+recipes appear after it expires, and deleted ones are checked for before the
+plan is written.
+"""
+import random
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import transaction
+
+from jedzonko.models import DayName, Plan, Recipe, RecipePlan, meal_name
+from jedzonko.versions import bump_plan_versions
+
+BUCKET_MINUTES = 5
+# The meal is drawn from this many best-voted recipes that fit, weighted by votes.
+CHOICES = 5
+
+
+class PlanGenerationError(ValueError):
+    pass
+
+
+class RecipeIndex:
+    """
+    Recipes bucketed by preparation time, each bucket ordered from the most voted.
+
+    Attributes:
+    - keys (list): Sorted bucket numbers, preparation time // BUCKET_MINUTES.
+    - buckets (list): For every key, a list of (vote, id, preparation time), the most voted first.
+
+    Methods:
+    - candidates(self, max_time, exclude, limit): Return up to `limit` of the most voted recipes
+      taking at most max_time minutes (any time when None), skipping the ids in exclude.
+    - shortest(self, exclude): Return the shortest preparation time of the recipes not in exclude.
+
+    Example usage:
+    >>> index = RecipeIndex(Recipe.objects.values_list('id', 'preparation_time', 'vote'))
+    >>> index.candidates(30, exclude=set(), limit=3)
+    [(48, 1021, 25), (40, 77, 10), (35, 412, 30)]
+    """
+    def __init__(self, rows):
+        buckets = {}
+        for recipe_id, preparation_time, vote in rows:
+            preparation_time = max(preparation_time or 0, 0)
+            buckets.setdefault(preparation_time // BUCKET_MINUTES, []).append((vote, recipe_id, preparation_time))
+        self.keys = sorted(buckets)
+        self.buckets = [sorted(buckets[key], reverse=True) for key in self.keys]
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def candidates(self, max_time, exclude, limit):
+        if max_time is None:
+            buckets = self.buckets
+        else:
+            buckets = self.buckets[:bisect_right(self.keys, max_time // BUCKET_MINUTES)]
+        found = []
+        for bucket in buckets:
+            taken = 0
+            for recipe in bucket:
+                if taken == limit:
+                    break
+                if (max_time is None or recipe[2] <= max_time) and recipe[1] not in exclude:
+                    found.append(recipe)
+                    taken += 1
+        found.sort(reverse=True)
+        return found[:limit]
+
+    def shortest(self, exclude):
+        for bucket in self.buckets:
+            times = [preparation_time for _, recipe_id, preparation_time in bucket if recipe_id not in exclude]
+            if times:
+                return min(times)
+        return None
+
+
+_index = None
+_index_loaded = 0
+
+
+def recipe_index(reload=False):
+    """
+    Return the RecipeIndex of all recipes, loading it with one query when it is missing or expired.
+    """
+    global _index, _index_loaded
+    if reload or _index is None or time.monotonic() - _index_loaded > settings.PLAN_GENERATOR_INDEX_TIMEOUT:
+        _index = RecipeIndex(Recipe.objects.values_list('id', 'preparation_time', 'vote').iterator())
+        _index_loaded = time.monotonic()
+    return _index
+
+
+def generate_week(index, meals_per_day, max_day_time=None, no_repeat_days=7, rng=random):
+    """
+    Return the meals of a week as a list of (DayName, meal order, recipe id).
+
+    Meals are filled day by day. Every meal is drawn from the best-voted recipes
+    that were not used in the previous no_repeat_days - 1 days and leave enough
+    of the day's max_day_time minutes for the shortest remaining recipe in each
+    meal still to fill. Raises PlanGenerationError when no recipe fits a meal.
+    """
+    if meals_per_day < 1:
+        raise PlanGenerationError("Plan musi mieć co najmniej jeden posiłek dziennie")
+    if not len(index):
+        raise PlanGenerationError("Brak przepisów")
+
+    week = []
+    used_on = []
+    for day_number, day in enumerate(DayName):
+        recent = set().union(*used_on[max(0, day_number - no_repeat_days + 1):])
+        today = set()
+        time_left = max_day_time
+        for order in range(1, meals_per_day + 1):
+            exclude = recent | today
+            if max_day_time is None:
+                max_time = None
+            elif order < meals_per_day:
+                max_time = time_left - (meals_per_day - order) * (index.shortest(exclude) or 0)
+            else:
+                max_time = time_left
+            candidates = index.candidates(max_time, exclude, CHOICES)
+            if not candidates:
+                raise PlanGenerationError("Brak przepisu pasującego do posiłku %d w dniu %s"
+                                          % (order, day.display_name()))
+            vote, recipe_id, preparation_time = rng.choices(
+                candidates, weights=[max(vote, 0) + 1 for vote, _, _ in candidates])[0]
+            today.add(recipe_id)
+            if max_day_time is not None:
+                time_left -= preparation_time
+            week.append((day, order, recipe_id))
+        used_on.append(today)
+    return week
+
+
+def generate_plan(name, meals_per_day=3, max_day_time=None, no_repeat_days=7, description='', seed=None):
+    """
+    Create a plan with a generated week of meals and return it.
+
+    The meals are written with one bulk insert. If a drawn recipe was deleted
+    since the index was loaded, the index is reloaded and the week drawn again.
+
+    Example usage:
+    >>> plan = generate_plan('Tydzień 1', meals_per_day=3, max_day_time=90, no_repeat_days=7)
+    """
+    rng = random.Random(seed)
+    week = generate_week(recipe_index(), meals_per_day, max_day_time, no_repeat_days, rng)
+    recipe_ids = {recipe_id for _, _, recipe_id in week}
+    if Recipe.objects.filter(id__in=recipe_ids).count() != len(recipe_ids):
+        week = generate_week(recipe_index(reload=True), meals_per_day, max_day_time, no_repeat_days, rng)
+
+    with transaction.atomic():
+        plan = Plan.objects.create(name=name, description=description or 'Plan wygenerowany automatycznie')
+        RecipePlan.objects.bulk_create([
+            RecipePlan(plan=plan, recipe_id=recipe_id, meal_name=meal_name(order), meal_order=order,
+                       weekday=day.weekday)
+            for day, order, recipe_id in week
+        ])
+        bump_plan_versions([plan.id])
+    return plan
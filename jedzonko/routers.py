@@ -0,0 +1,115 @@
+"""
+Routing of reads to database replicas, with read-your-writes stickiness.
+
+ReplicaRouter sends every write to the 'default' database. Reads go to 'default'
+too unless ReplicaMiddleware has picked a replica for the current request, which
+it does for GET, HEAD and OPTIONS requests of clients that have not written
+recently. The body of a streaming response reads from the same database as the
+view, since it runs its queries after the view has returned. A request with any
+other method reads from 'default' and sets a cookie
+keeping that client's reads on 'default' for settings.REPLICA_STICKY_SECONDS, so
+it sees its own writes however far the replicas lag behind. A request that
+writes is moved to 'default' for the rest of its reads as well.
+
+Commands, the shell and other code outside a request always use 'default'.
+Replicas are listed in settings.DATABASE_REPLICAS.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'db_primary_until'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """
+    Database router sending reads to the replica chosen for the request and writes to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Read the request's own writes from here on.
+        _read_alias.set(None)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+def _target(settings_dict):
+    return tuple(settings_dict.get(key) for key in ('ENGINE', 'NAME', 'HOST', 'PORT'))
+
+
+def replicas():
+    """
+    Return the replica aliases, leaving out any that points at the primary database itself.
+
+    That is the case for a replica with TEST MIRROR set to 'default' during tests,
+    where a second connection would not see the data written in the transaction
+    of a TestCase.
+    """
+    primary = _target(connections[PRIMARY].settings_dict)
+    return [alias for alias in settings.DATABASE_REPLICAS
+            if alias not in connections or _target(connections[alias].settings_dict) != primary]
+
+
+def _read_from(alias, chunks):
+    """
+    Yield the chunks, producing each one with reads sent to the alias.
+    """
+    chunks = iter(chunks)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield chunk
+
+
+def is_sticky(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaMiddleware:
+    """
+    Middleware choosing the database the request reads from.
+
+    It must come before any middleware that reads from the database, such as the
+    session and authentication middleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        aliases = replicas()
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS')
+        alias = random.choice(aliases) if aliases and safe and not is_sticky(request) else None
+        token = _read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+            # A write in the view has moved the reads back to the primary.
+            alias = _read_alias.get()
+        finally:
+            _read_alias.reset(token)
+        if alias and response.streaming:
+            response.streaming_content = _read_from(alias, response.streaming_content)
+
+        if not safe and aliases:
+            window = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, '%d' % (time.time() + window), max_age=window,
+                                httponly=True, samesite='Lax')
+        return response
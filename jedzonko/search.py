@@ -0,0 +1,152 @@
+"""
+Full-text search over recipe names, ingredients and descriptions.
+
+On PostgreSQL the recipe table carries a `search_vector` tsvector column with a
+GIN index; on SQLite the text is copied to the `jedzonko_recipe_fts` FTS5 table.
+Both are created by migration 0012 and kept up to date by index_recipe() and
+unindex_recipe(), which jedzonko.signals calls when a recipe is saved or deleted.
+Rows written without signals are indexed with index_recipe_range(), and
+rebuild_index(), run by the `rebuild_search_index` management command, indexes
+the whole table again.
+
+Results are ordered by text relevance multiplied by a vote factor growing from 1
+to 2 as the recipe collects votes, so a popular recipe wins among equally good
+matches but never outranks a clearly better one.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from jedzonko.models import Recipe
+
+FTS_TABLE = 'jedzonko_recipe_fts'
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(ingredients, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+VOTE_FACTOR = "(1.0 + (CASE WHEN r.vote > 0 THEN r.vote ELSE 0 END) * 1.0 / " \
+              "((CASE WHEN r.vote > 0 THEN r.vote ELSE 0 END) + %(damping)s))"
+
+
+def terms(query):
+    """
+    Split a user query into words, dropping everything a search syntax could interpret.
+    """
+    return re.findall(r'\w+', query.lower())
+
+
+def search_recipes(query, limit=None):
+    """
+    Return the recipes matching all words of the query, best matches first.
+
+    Every word also matches as a prefix, so 'pomidor' finds 'pomidorowa'.
+
+    Example usage:
+    >>> search_recipes('zupa pomidor', limit=10)
+    [<Recipe: Recipe object (3)>, <Recipe: Recipe object (12)>]
+    """
+    words = terms(query)
+    if not words:
+        return []
+    limit = limit or settings.SEARCH_RESULTS_LIMIT
+    factor = VOTE_FACTOR % {'damping': float(settings.SEARCH_VOTE_DAMPING)}
+
+    if connection.vendor == 'postgresql':
+        sql = (
+            "SELECT r.id FROM jedzonko_recipe r, to_tsquery('simple', %s) q "
+            "WHERE r.search_vector @@ q "
+            "ORDER BY ts_rank(r.search_vector, q) * " + factor + " DESC, r.id LIMIT %s"
+        )
+        params = [' & '.join('%s:*' % word for word in words), limit]
+    elif connection.vendor == 'sqlite':
+        sql = (
+            "SELECT r.id FROM " + FTS_TABLE + " f JOIN jedzonko_recipe r ON r.id = f.rowid "
+            "WHERE " + FTS_TABLE + " MATCH %s "
+            "ORDER BY -bm25(" + FTS_TABLE + ", 10.0, 4.0, 1.0) * " + factor + " DESC, r.id LIMIT %s"
+        )
+        params = [' '.join('"%s"*' % word for word in words), limit]
+    else:
+        recipes = Recipe.objects.all()
+        for word in words:
+            recipes = recipes.filter(Q(name__icontains=word) | Q(ingredients__icontains=word) |
+                                     Q(description__icontains=word))
+        return list(recipes.order_by('-vote', 'id')[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    recipes = Recipe.objects.in_bulk(ids)
+    return [recipes[pk] for pk in ids if pk in recipes]
+
+
+def index_recipe(recipe):
+    """
+    Store the current text of the recipe in the search index.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("UPDATE jedzonko_recipe SET search_vector = " + POSTGRES_VECTOR + " WHERE id = %s",
+                           [recipe.id])
+        elif connection.vendor == 'sqlite':
+            cursor.execute("DELETE FROM " + FTS_TABLE + " WHERE rowid = %s", [recipe.id])
+            cursor.execute("INSERT INTO " + FTS_TABLE + " (rowid, name, ingredients, description) "
+                           "VALUES (%s, %s, %s, %s)",
+                           [recipe.id, recipe.name, recipe.ingredients, recipe.description])
+
+
+def unindex_recipe(recipe_id):
+    """
+    Remove a deleted recipe from the search index.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM " + FTS_TABLE + " WHERE rowid = %s", [recipe_id])
+
+
+def index_recipe_range(first_id, last_id):
+    """
+    Store the current text of all recipes with ids from first_id to last_id in the search index.
+
+    Used for recipes written with bulk_create, which does not send post_save.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("UPDATE jedzonko_recipe SET search_vector = " + POSTGRES_VECTOR +
+                           " WHERE id BETWEEN %s AND %s", [first_id, last_id])
+        elif connection.vendor == 'sqlite':
+            cursor.execute("DELETE FROM " + FTS_TABLE + " WHERE rowid BETWEEN %s AND %s", [first_id, last_id])
+            cursor.execute("INSERT INTO " + FTS_TABLE + " (rowid, name, ingredients, description) "
+                           "SELECT id, name, ingredients, description FROM jedzonko_recipe "
+                           "WHERE id BETWEEN %s AND %s", [first_id, last_id])
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuild the search index of all recipes in batches of primary keys and return the number of recipes indexed.
+
+    Each batch replaces the index of its whole range of ids, rows of deleted
+    recipes included, in its own transaction. Searches during a rebuild see every
+    recipe indexed, with its old or its new text, and a rebuild of a large table
+    does not hold locks on all of it at once.
+    """
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return 0
+
+    indexed = 0
+    last_id = 0
+    while True:
+        ids = list(Recipe.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute("DELETE FROM " + FTS_TABLE + " WHERE rowid > %s", [last_id])
+            return indexed
+        with transaction.atomic():
+            index_recipe_range(last_id + 1, ids[-1])
+        indexed += len(ids)
+        last_id = ids[-1]
@@ -0,0 +1,65 @@
+"""
+Shopping lists summing the ingredients of all meals in a plan.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from jedzonko.models import DayName, RecipeIngredient
+from jedzonko.versions import get_version
+
+CACHE_KEY = 'shopping-list:%s:%s:%s'
+
+
+def _amount(quantity):
+    if quantity is None:
+        return None
+    return quantity.quantize(1) if quantity == quantity.to_integral() else quantity.normalize()
+
+
+def shopping_list(plan, per_day=False):
+    """
+    Return the ingredients needed for the plan, summed per ingredient and unit.
+
+    The list is computed with one aggregate query over the plan's meals and cached
+    under the plan version, so it is recomputed after a meal of the plan or one of
+    its recipes changes. Items are dicts with
+    the ingredient name, unit, summed quantity (None if no meal gives one) and the
+    number of meals using the ingredient. With per_day the result is a list of
+    (day, items) pairs in week order instead.
+
+    Example usage:
+    >>> shopping_list(plan)
+    [{'name': 'mąka', 'unit': 'g', 'quantity': Decimal('450'), 'meals': 2}, ...]
+    """
+    key = CACHE_KEY % (plan.id, get_version('plan', plan.id), 'day' if per_day else 'all')
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    fields = ['ingredient__name', 'unit']
+    if per_day:
+        fields.insert(0, 'recipe__recipeplan__weekday')
+    rows = (RecipeIngredient.objects
+            .filter(recipe__recipeplan__plan=plan)
+            .values(*fields)
+            .annotate(quantity=Sum('quantity'), meals=Count('id'))
+            .order_by(*fields))
+    days = [(day.value, []) for day in DayName]
+    result = []
+    for row in rows:
+        item = {
+            'name': row['ingredient__name'],
+            'unit': row['unit'],
+            'quantity': _amount(row['quantity']),
+            'meals': row['meals'],
+        }
+        if per_day:
+            days[row['recipe__recipeplan__weekday']][1].append(item)
+        else:
+            result.append(item)
+    if per_day:
+        result = [(day, items) for day, items in days if items]
+    cache.set(key, result, settings.FRAGMENT_CACHE_TIMEOUT)
+    return result
+
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from jedzonko.counters import add
+from jedzonko.ingredients import save_recipe_ingredients
+from jedzonko.models import Plan, Recipe, RecipePlan
+from jedzonko.search import index_recipe, unindex_recipe
+from jedzonko.similar import index_recipes
+from jedzonko.versions import bump_plan_versions, bump_versions
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        add('recipe', 1)
+    index_recipe(instance)
+    parsed = save_recipe_ingredients([instance])
+    index_recipes([instance], parsed)
+    bump_versions('recipe', [instance.id])
+    plan_ids = RecipePlan.objects.filter(recipe_id=instance.id).values_list('plan_id', flat=True).distinct()
+    bump_plan_versions(list(plan_ids))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    add('recipe', -1)
+    unindex_recipe(instance.id)
+    bump_versions('recipe', [instance.id])
+
+
+@receiver(post_save, sender=Plan)
+def plan_saved(sender, instance, created, **kwargs):
+    if created:
+        add('plan', 1)
+    bump_versions('plan', [instance.id])
+
+
+@receiver(post_delete, sender=Plan)
+def plan_deleted(sender, instance, **kwargs):
+    add('plan', -1)
+    bump_versions('plan', [instance.id])
+
+
+@receiver(post_save, sender=RecipePlan)
+@receiver(post_delete, sender=RecipePlan)
+def recipe_plan_changed(sender, instance, **kwargs):
+    bump_plan_versions([instance.plan_id])
@@ -0,0 +1,171 @@
+"""
+Similar recipes by the overlap of their ingredient names.
+
+Every recipe gets a MinHash signature of its set of ingredient names: for each of
+NUM_HASHES hash functions, the smallest hash of any name. Two signatures agree at
+a position with probability equal to the Jaccard similarity of the two sets. The
+signature is split into BANDS bands and each band is hashed into a bucket, so
+recipes sharing a bucket in any band are likely to have similar ingredients
+(with 16 bands of 4 rows, a pair with a Jaccard similarity of 0.5 shares a bucket
+with probability 0.64, a pair at 0.8 with probability 0.999).
+
+Signatures and buckets are stored in RecipeSignature and RecipeBand, written by
+jedzonko.signals when a recipe is saved and rebuilt by the
+`rebuild_similar_index` management command. similar_recipes() finds the
+candidates through the bucket index and ranks them by the agreement of their
+signatures with one query, and caches the result.
+"""
+import random
+from array import array
+from functools import lru_cache
+from hashlib import blake2b
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from jedzonko.ingredients import parse_ingredients
+from jedzonko.models import RecipeBand, RecipeSignature
+from jedzonko.versions import get_version
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+# Candidates ranked by their signatures, per recipe shown.
+CANDIDATES = 10
+CACHE_KEY = 'similar-recipes:%s:%s:%s'
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+_rng = random.Random(20240125)
+_COEFFICIENTS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+
+@lru_cache(maxsize=100000)
+def _name_hashes(name):
+    """
+    Return the NUM_HASHES hashes of one name; ingredient names repeat a lot, so they are memoized.
+    """
+    x = int.from_bytes(blake2b(name.encode(), digest_size=8).digest(), 'big') % _PRIME
+    return tuple(((a * x + b) % _PRIME) & _MASK for a, b in _COEFFICIENTS)
+
+
+def minhash(names):
+    """
+    Return the MinHash signature of a set of names as a tuple of NUM_HASHES integers, or None for an empty set.
+    """
+    hashes = [_name_hashes(name) for name in set(names)]
+    if not hashes:
+        return None
+    return tuple(map(min, *hashes)) if len(hashes) > 1 else hashes[0]
+
+
+def bands(signature):
+    """
+    Return the (band, bucket) pairs of a signature.
+    """
+    return [(band, int.from_bytes(blake2b(array('I', signature[band * ROWS:(band + 1) * ROWS]).tobytes(),
+                                          digest_size=8).digest(), 'big', signed=True))
+            for band in range(BANDS)]
+
+
+def signatures(rows):
+    """
+    Return (recipe id, signature) for (recipe id, ingredients text) rows, skipping recipes without ingredients.
+
+    The function does not touch the database, so it can run in worker processes.
+    """
+    return parsed_signatures((recipe_id, parse_ingredients(ingredients)) for recipe_id, ingredients in rows)
+
+
+def parsed_signatures(rows):
+    """
+    Return (recipe id, signature) for (recipe id, parsed ingredients) rows, skipping recipes without ingredients.
+    """
+    result = []
+    for recipe_id, items in rows:
+        signature = minhash(item.name for item in items)
+        if signature is not None:
+            result.append((recipe_id, signature))
+    return result
+
+
+def save_signatures(recipe_ids, computed):
+    """
+    Replace the stored signatures and buckets of the recipes with the computed ones.
+
+    Recipes in recipe_ids without a computed signature lose their old one.
+    """
+    recipe_ids = list(recipe_ids)
+    with transaction.atomic():
+        RecipeBand.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.bulk_create([
+            RecipeSignature(recipe_id=recipe_id, minhash=array('I', signature).tobytes())
+            for recipe_id, signature in computed
+        ])
+        RecipeBand.objects.bulk_create([
+            RecipeBand(recipe_id=recipe_id, band=band, bucket=bucket)
+            for recipe_id, signature in computed
+            for band, bucket in bands(signature)
+        ])
+
+
+def index_recipes(recipes, parsed=None):
+    """
+    Compute and store the signatures of the recipes.
+
+    `parsed` is the dict returned by jedzonko.ingredients.save_recipe_ingredients;
+    with it the ingredients are not parsed a second time.
+    """
+    recipes = list(recipes)
+    if parsed is None:
+        computed = signatures((recipe.id, recipe.ingredients) for recipe in recipes)
+    else:
+        computed = parsed_signatures((recipe.id, parsed[recipe.id]) for recipe in recipes)
+    save_signatures([recipe.id for recipe in recipes], computed)
+
+
+def similar_recipes(recipe_id, limit=None):
+    """
+    Return the recipes most similar to the recipe, most similar first.
+
+    Items are dicts with the recipe id, name and the estimated Jaccard similarity
+    of the ingredient names. The list is cached under the recipe version for
+    settings.SIMILAR_RECIPES_TIMEOUT seconds, so recipes added or changed since
+    then may be missing from it until it expires.
+
+    Example usage:
+    >>> similar_recipes(12, limit=3)
+    [{'id': 40, 'name': 'Zupa pomidorowa', 'similarity': 0.84}, ...]
+    """
+    limit = limit or settings.SIMILAR_RECIPES
+    key = CACHE_KEY % (recipe_id, get_version('recipe', recipe_id), limit)
+    similar = cache.get(key)
+    if similar is not None:
+        return similar
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT other.recipe_id, r.name, s.minhash, ms.minhash, COUNT(*) AS shared "
+            "FROM jedzonko_recipeband mine "
+            "JOIN jedzonko_recipeband other ON other.band = mine.band AND other.bucket = mine.bucket "
+            "AND other.recipe_id <> mine.recipe_id "
+            "JOIN jedzonko_recipe r ON r.id = other.recipe_id "
+            "JOIN jedzonko_recipesignature s ON s.recipe_id = other.recipe_id "
+            "JOIN jedzonko_recipesignature ms ON ms.recipe_id = mine.recipe_id "
+            "WHERE mine.recipe_id = %s "
+            "GROUP BY other.recipe_id, r.name, s.minhash, ms.minhash "
+            "ORDER BY shared DESC, other.recipe_id LIMIT %s",
+            [recipe_id, limit * CANDIDATES])
+        rows = cursor.fetchall()
+
+    similar = []
+    for other_id, name, other_minhash, own_minhash, _ in rows:
+        other, own = array('I', bytes(other_minhash)), array('I', bytes(own_minhash))
+        agreement = sum(1 for a, b in zip(own, other) if a == b) / NUM_HASHES
+        similar.append({'id': other_id, 'name': name, 'similarity': round(agreement, 2)})
+    similar.sort(key=lambda item: (-item['similarity'], item['id']))
+    similar = similar[:limit]
+    cache.set(key, similar, settings.SIMILAR_RECIPES_TIMEOUT)
+    return similar
@@ -0,0 +1,225 @@
+"""
+Fingerprinted, precompressed static files served by the WSGI application itself.
+
+`python manage.py collectstatic` copies the files to settings.STATIC_ROOT through
+CompressedManifestStaticFilesStorage, which adds a hash of the content to every
+file name (style.css -> style.5f3b2a1c9e0d.css, with the URLs inside CSS files
+rewritten to match), writes the staticfiles.json manifest used by the
+{% static %} tag, and stores a gzip variant (and a brotli one when the brotli
+package is installed) of every text file that compresses well.
+
+StaticFilesApp wraps the Django application in scrumlab/wsgi.py and answers
+requests for those files without going through Django. Hashed names never
+change their content, so they are sent with a one-year immutable Cache-Control;
+the plain names get settings.STATIC_MAX_AGE seconds. Clients accepting brotli
+or gzip get that variant, with Vary: Accept-Encoding.
+"""
+import gzip
+import json
+import mimetypes
+import os
+from email.utils import formatdate
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.txt', '.html', '.xml', '.map', '.ico')
+# A variant is kept only when it is smaller than this fraction of the original.
+MIN_RATIO = 0.95
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+# Content-Encoding and file suffix of the variants, in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compressors():
+    """
+    Return (file suffix, function) for every compression available.
+    """
+    found = [('.gz', lambda content: gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        found.insert(0, ('.br', lambda content: brotli.compress(content, quality=11)))
+    return found
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also stores compressed variants of the collected files.
+
+    Until collectstatic has written a manifest, the {% static %} tag uses the plain
+    file names, so a checkout runs with DEBUG off before the files are collected.
+
+    Methods:
+    - post_process(self, paths, dry_run=False, **options): Hash the files, then compress
+      the plain and the hashed copy of each.
+    - compress(self, name): Store the compressed variants of one file.
+    """
+    def url(self, name, force=False):
+        if not self.hashed_files and not force:
+            return StaticFilesStorage.url(self, name)
+        return super().url(name, force)
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = {}
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed[name] = hashed_name
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name, hashed_name in hashed.items():
+            self.compress(name)
+            self.compress(hashed_name)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+            return
+        with self.open(name) as original:
+            content = original.read()
+        for suffix, compress in compressors():
+            compressed = compress(content)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(compressed) < len(content) * MIN_RATIO:
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def accepted_encodings(header):
+    """
+    Return the content codings an Accept-Encoding header allows.
+
+    Example usage:
+    >>> accepted_encodings('gzip, br;q=0')
+    {'gzip'}
+    """
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    """
+    One collected file and its compressed variants.
+
+    Attributes:
+    - path (str): Path of the file on disk.
+    - headers (list): Content-Type, Cache-Control and Last-Modified headers.
+    - variants (dict): Content-Encoding -> (path, size, ETag), with None for the file itself.
+    """
+    def __init__(self, path, cache_control):
+        stat = os.stat(path)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        self.path = path
+        self.headers = [
+            ('Content-Type', content_type),
+            ('Cache-Control', cache_control),
+            ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+        ]
+        tag = '%x-%x' % (int(stat.st_mtime), stat.st_size)
+        self.variants = {None: (path, stat.st_size, '"%s"' % tag)}
+        for coding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants[coding] = (path + suffix, os.path.getsize(path + suffix), '"%s-%s"' % (tag, coding))
+
+    def variant(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for coding, _ in ENCODINGS:
+            if coding in accepted and coding in self.variants:
+                return coding
+        return None
+
+
+class StaticFilesApp:
+    """
+    WSGI middleware serving the collected static files and passing every other request to the application.
+
+    The files in settings.STATIC_ROOT are listed once, when the application starts,
+    so files collected later are served after a restart. Nothing is served when
+    STATIC_URL is not a path on this site or STATIC_ROOT does not exist, so the
+    wrapper is harmless in development.
+
+    Example usage (scrumlab/wsgi.py):
+    >>> application = StaticFilesApp(get_wsgi_application())
+    """
+    def __init__(self, application):
+        self.application = application
+        self.prefix = settings.STATIC_URL
+        self.files = {}
+        if self.prefix.startswith('/') and settings.STATIC_ROOT and os.path.isdir(settings.STATIC_ROOT):
+            self.files = self.find_files(settings.STATIC_ROOT)
+
+    def find_files(self, root):
+        immutable = set()
+        manifest = os.path.join(root, ManifestStaticFilesStorage.manifest_name)
+        if os.path.isfile(manifest):
+            with open(manifest, encoding='utf-8') as manifest_file:
+                immutable.update(json.load(manifest_file).get('paths', {}).values())
+
+        variant_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                base, suffix = os.path.splitext(path)
+                if suffix in variant_suffixes and os.path.isfile(base):
+                    continue
+                cache_control = IMMUTABLE if relative in immutable else 'public, max-age=%d' % settings.STATIC_MAX_AGE
+                files[self.prefix + relative] = StaticFile(path, cache_control)
+        return files
+
+    def __call__(self, environ, start_response):
+        static_file = self.files.get(environ.get('PATH_INFO', ''))
+        method = environ.get('REQUEST_METHOD')
+        if static_file is None or method not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+
+        headers = list(static_file.headers)
+        if len(static_file.variants) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+        coding = static_file.variant(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        path, size, etag = static_file.variants[coding]
+        headers.append(('ETag', etag))
+
+        if etag in (tag.strip() for tag in environ.get('HTTP_IF_NONE_MATCH', '').split(',')):
+            start_response('304 Not Modified', headers)
+            return []
+        if coding:
+            headers.append(('Content-Encoding', coding))
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        body = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper:
+            return file_wrapper(body, CHUNK_SIZE)
+        return _read_chunks(body)
+
+
+def _read_chunks(body):
+    with body:
+        while True:
+            chunk = body.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
@@ -1,3 +1,1312 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+
+from jedzonko.counters import get_counts
+from jedzonko.ingredients import ParsedIngredient, parse_ingredients
+from jedzonko.management.commands.import_recipes import create_recipes
+from jedzonko.meal_grid import MealGridError, add_meals
+from jedzonko.models import Plan, Recipe, RecipeBand, RecipePlan, RecipeSignature, RowCount, DayName
+from jedzonko.pagination import CursorPaginator
+from jedzonko.planner import PlanGenerationError, RecipeIndex, generate_plan, generate_week, recipe_index
+from jedzonko.routers import STICKY_COOKIE, ReplicaMiddleware
+from jedzonko import search
+from jedzonko.search import rebuild_index, search_recipes
+from jedzonko.shopping import shopping_list
+from jedzonko.similar import minhash, similar_recipes
+from jedzonko.staticfiles import StaticFilesApp
+from jedzonko import versions, votes
+from jedzonko.versions import get_version
+from jedzonko.test_runner import TEST_CACHES
+from jedzonko.votes import JOURNAL_HEAD_KEY, add_vote, check_vote_buffer, flush_votes, pending_votes
+from jedzonko.warmup import warmup
+
+
+def create_plan_with_meals(meals_per_day, name='Plan'):
+    """
+    Create a plan with the given number of meals for every day of the week.
+    """
+    plan = Plan.objects.create(name=name, description='Opis planu')
+    for day in DayName:
+        for order in range(1, meals_per_day + 1):
+            recipe = Recipe.objects.create(name='Przepis %s %s' % (day.name, order),
+                                           ingredients='Składniki',
+                                           description='Opis',
+                                           preparation_time=10)
+            RecipePlan.objects.create(recipe=recipe, plan=plan, meal_name='Posiłek %s' % order,
+                                      meal_order=order, weekday=day.weekday)
+    return plan
+
+
+class PlanWeekTest(TestCase):
+    def test_week_is_grouped_by_day_and_ordered(self):
+        plan = Plan.objects.create(name='Plan', description='Opis')
+        recipe = Recipe.objects.create(name='Przepis', ingredients='Składniki', description='Opis',
+                                       preparation_time=10)
+        RecipePlan.objects.create(recipe=recipe, plan=plan, meal_name='Kolacja', meal_order=2,
+                                  weekday=DayName.TUE.weekday)
+        RecipePlan.objects.create(recipe=recipe, plan=plan, meal_name='Śniadanie', meal_order=1,
+                                  weekday=DayName.TUE.weekday)
+
+        with self.assertNumQueries(1):
+            week = plan.week()
+            names = [[(meal.meal_name, meal.recipe.name) for meal in meals] for day, meals in week]
+
+        self.assertEqual([day for day, meals in week], [day.value for day in DayName])
+        self.assertEqual(names[1], [('Śniadanie', 'Przepis'), ('Kolacja', 'Przepis')])
+        self.assertEqual(names[0], [])
+
+    def test_week_is_ordered_by_the_database(self):
+        plan = create_plan_with_meals(2)
+        with CaptureQueriesContext(connection) as queries:
+            plan.week()
+        self.assertIn('ORDER BY "jedzonko_recipeplan"."weekday" ASC, "jedzonko_recipeplan"."meal_order" ASC',
+                      queries[0]['sql'])
+
+    def test_weekday_out_of_range_is_rejected(self):
+        plan = create_plan_with_meals(1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RecipePlan.objects.create(recipe=Recipe.objects.first(), plan=plan, meal_name='Posiłek', meal_order=1,
+                                      weekday=7)
+
+
+class WeekdayMigrationTest(TransactionTestCase):
+    before = [('jedzonko', '0018_row_counts')]
+    after = [('jedzonko', '0019_recipeplan_weekday')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_day_names_and_keys_become_weekdays(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        recipe = apps.get_model('jedzonko', 'Recipe').objects.create(
+            name='Przepis', ingredients='Składniki', description='Opis', preparation_time=10)
+        plan = apps.get_model('jedzonko', 'Plan').objects.create(name='Plan', description='Opis')
+        for order, day_name in enumerate(('Wtorek', 'TUE', 'SUN', 'Poniedziałek', 'dzień'), 1):
+            apps.get_model('jedzonko', 'RecipePlan').objects.create(
+                recipe_id=recipe.id, plan_id=plan.id, meal_name='Posiłek', meal_order=order, day_name=day_name)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        weekdays = apps.get_model('jedzonko', 'RecipePlan').objects.order_by('meal_order').values_list('weekday',
+                                                                                                     flat=True)
+        self.assertEqual(list(weekdays), [1, 1, 6, 0, 0])
+
+
+class DashboardViewTest(TestCase):
+    def test_query_count_does_not_depend_on_meals(self):
+        create_plan_with_meals(1)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+        create_plan_with_meals(5, name='Większy plan')
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Większy plan')
+
+
+class PlanDetailsViewTest(TestCase):
+    def test_meals_are_rendered_under_their_day_with_one_meals_query(self):
+        plan = create_plan_with_meals(3)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('plan_details', kwargs={'id': plan.id}))
+        self.assertEqual(len(response.context['week']()), len(DayName))
+        self.assertContains(response, 'Przepis SUN 3')
+        self.assertContains(response, 'Posiłek 1', count=len(DayName))
+
+
+class RecipeSampleTest(TestCase):
+    def create_recipes(self, count):
+        return [Recipe.objects.create(name='Przepis %s' % i, ingredients='Składniki', description='Opis',
+                                      preparation_time=10) for i in range(count)]
+
+    def test_sample_returns_distinct_recipes(self):
+        self.create_recipes(10)
+        sample = Recipe.objects.sample(3)
+        self.assertEqual(len(sample), 3)
+        self.assertEqual(len({recipe.id for recipe in sample}), 3)
+
+    def test_sample_skips_gaps_in_ids(self):
+        recipes = self.create_recipes(50)
+        kept = {recipes[0].id, recipes[-1].id}
+        Recipe.objects.exclude(id__in=kept).delete()
+        for _ in range(10):
+            self.assertEqual({recipe.id for recipe in Recipe.objects.sample(3)}, kept)
+
+    def test_sample_of_empty_table(self):
+        self.assertEqual(Recipe.objects.sample(3), [])
+
+
+class IndexViewTest(TestCase):
+    def test_carousel_fetches_only_rendered_columns(self):
+        for i in range(5):
+            Recipe.objects.create(name='Przepis %s' % i, ingredients='Składniki', description='Opis',
+                                  preparation_time=10)
+        response = self.client.get(reverse('index'))
+        carousel = [recipe for index, recipe in response.context['carousel_with_index']]
+        self.assertEqual(len(carousel), 3)
+        self.assertEqual(carousel[0].get_deferred_fields(),
+                         {'ingredients', 'created', 'updated', 'preparation_time', 'vote', 'how_to_prepare'})
+
+
+class RecipeVoteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipe = Recipe.objects.create(name='Przepis', ingredients='Składniki', description='Opis',
+                                            preparation_time=10, vote=5)
+
+    def test_vote_updates_only_the_vote_column(self):
+        Recipe.objects.filter(id=self.recipe.id).update(name='Zmieniony')
+        response = self.client.post(reverse('recipe_details', kwargs={'id': self.recipe.id}), {'vote': 1})
+        self.assertEqual(response.context['recipe'].vote, 6)
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        self.assertEqual((recipe.vote, recipe.name), (6, 'Zmieniony'))
+
+    @override_settings(VOTE_BUFFER=True, VOTE_BUFFER_MIN_VOTES=5)
+    @mock.patch('jedzonko.votes.SHARED_CACHE_BACKENDS', (TEST_CACHES['default']['BACKEND'],))
+    def test_buffered_votes_are_flushed_exactly(self):
+        other = Recipe.objects.create(name='Inny', ingredients='Składniki', description='Opis',
+                                      preparation_time=10, vote=10)
+        with self.assertNumQueries(0):
+            for _ in range(20):
+                add_vote(self.recipe, 1)
+            add_vote(other, -1)
+        self.assertEqual(add_vote(self.recipe, -1), 5 + 19)
+        self.assertEqual(Recipe.objects.get(id=self.recipe.id).vote, 5)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_votes(), 2)
+        self.assertEqual(Recipe.objects.get(id=self.recipe.id).vote, 24)
+        self.assertEqual(Recipe.objects.get(id=other.id).vote, 9)
+        self.assertEqual(pending_votes(self.recipe.id), 0)
+        self.assertEqual(flush_votes(), 0)
+
+    @override_settings(VOTE_BUFFER=True, VOTE_BUFFER_MIN_VOTES=5)
+    @mock.patch('jedzonko.votes.SHARED_CACHE_BACKENDS', (TEST_CACHES['default']['BACKEND'],))
+    def test_journal_gap_is_skipped_on_the_next_flush(self):
+        other = Recipe.objects.create(name='Inny', ingredients='Składniki', description='Opis',
+                                      preparation_time=10, vote=10)
+        add_vote(self.recipe, 1)
+        cache.incr(JOURNAL_HEAD_KEY)  # A worker died before writing its journal entry.
+        add_vote(other, 1)
+
+        self.assertEqual(flush_votes(), 1)
+        self.assertEqual(pending_votes(other.id), 1)
+        self.assertEqual(flush_votes(), 1)
+        self.assertEqual(Recipe.objects.get(id=other.id).vote, 11)
+        add_vote(other, 1)
+        self.assertEqual(flush_votes(), 1)
+        self.assertEqual(Recipe.objects.get(id=other.id).vote, 12)
+
+    @override_settings(VOTE_BUFFER=True, VOTE_BUFFER_MIN_VOTES=5)
+    @mock.patch('jedzonko.votes.SHARED_CACHE_BACKENDS', (TEST_CACHES['default']['BACKEND'],))
+    def test_failed_flush_gives_the_votes_back(self):
+        add_vote(self.recipe, 1)
+        add_vote(self.recipe, 1)
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_votes()
+        self.assertEqual(pending_votes(self.recipe.id), 2)
+        self.assertEqual(flush_votes(), 1)
+        self.assertEqual(Recipe.objects.get(id=self.recipe.id).vote, 7)
+
+    @override_settings(VOTE_BUFFER=True, VOTE_BUFFER_MIN_VOTES=5)
+    @mock.patch('jedzonko.votes.SHARED_CACHE_BACKENDS', (TEST_CACHES['default']['BACKEND'],))
+    def test_overlapping_flushes_write_the_votes_once(self):
+        def decr(key, delta=1, version=None):
+            # Like memcached, which stops a decrement at zero.
+            value = max(cache.get(key) - delta, 0)
+            cache.set(key, value, None)
+            return value
+
+        take = votes._take
+        overlapped = []
+
+        def take_after_another_flush(key, amount):
+            if not overlapped:
+                # The lock of the first flush expires and a second one writes the same votes.
+                overlapped.append(True)
+                cache.delete(votes.FLUSH_LOCK_KEY)
+                self.assertEqual(flush_votes(), 1)
+            return take(key, amount)
+
+        for _ in range(3):
+            add_vote(self.recipe, 1)
+        with mock.patch.object(cache, 'decr', decr), \
+                mock.patch('jedzonko.votes._take', take_after_another_flush):
+            self.assertEqual(flush_votes(), 0)
+        self.assertEqual(Recipe.objects.get(id=self.recipe.id).vote, 8)
+        self.assertEqual(pending_votes(self.recipe.id), 0)
+
+    @override_settings(VOTE_BUFFER=True)
+    def test_buffering_needs_a_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            add_vote(self.recipe, 1)
+        self.assertEqual([error.id for error in check_vote_buffer(None)], ['jedzonko.E001'])
+
+    @override_settings(VOTE_BUFFER=True, VOTE_BUFFER_MIN_VOTES=100)
+    @mock.patch('jedzonko.votes.SHARED_CACHE_BACKENDS', (TEST_CACHES['default']['BACKEND'],))
+    def test_unpopular_recipes_are_not_buffered(self):
+        add_vote(self.recipe, 1)
+        self.assertEqual(Recipe.objects.get(id=self.recipe.id).vote, 6)
+
+
+class CursorPaginatorTest(TestCase):
+    def setUp(self):
+        for i in range(7):
+            Recipe.objects.create(name='Przepis %s' % i, ingredients='Składniki', description='Opis',
+                                  preparation_time=10, vote=i % 3)
+        self.expected = list(Recipe.objects.order_by('-vote', '-created', '-id'))
+        self.paginator = CursorPaginator(Recipe.objects.all(), 3, ('-vote', '-created', '-id'))
+
+    def test_walks_forward_and_back(self):
+        first = self.paginator.page()
+        second = self.paginator.page(first.next_cursor)
+        third = self.paginator.page(second.next_cursor)
+        self.assertEqual(first.object_list + second.object_list + third.object_list, self.expected)
+        self.assertEqual((first.has_previous, first.has_next), (False, True))
+        self.assertEqual((third.has_previous, third.has_next), (True, False))
+        self.assertEqual(self.paginator.page(third.previous_cursor).object_list, second.object_list)
+        self.assertEqual(self.paginator.page(second.previous_cursor).object_list, first.object_list)
+
+    def test_last_page(self):
+        last = self.paginator.page(self.paginator.page().last_cursor)
+        self.assertEqual(last.object_list, self.expected[-3:])
+        self.assertFalse(last.has_next)
+
+    def test_invalid_cursor_returns_first_page(self):
+        for cursor in ('nonsense', 'WzFd', '!!'):
+            self.assertEqual(self.paginator.page(cursor).object_list, self.expected[:3])
+
+    def test_cursor_with_nulls_returns_first_page(self):
+        Plan.objects.create(name='Plan', description='Opis')
+        for url, cursor in (('plan_list', 'WyJuIixbbnVsbCwxXV0'), ('recipe_list', 'WyJuIixbbnVsbCxudWxsLG51bGxdXQ'),
+                            ('recipe_list', 'WyJuIiwiYWJjIl0')):
+            response = self.client.get(reverse(url), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.context['recipes' if url == 'recipe_list' else 'plans'].has_previous)
+
+
+class RecipeListViewTest(TestCase):
+    def test_pages_do_not_count_rows(self):
+        cache.clear()
+        for i in range(5):
+            Recipe.objects.create(name='Przepis %s' % i, ingredients='Składniki', description='Opis',
+                                  preparation_time=10)
+        self.client.get(reverse('recipe_list'))
+        response = self.client.get(reverse('recipe_list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('recipe_list'), {'cursor': response.context['recipes'].next_cursor})
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(response.context['recipes_count'], 5)
+
+
+class RecipeSearchTest(TestCase):
+    def create_recipe(self, name, ingredients='Sól', description='Opis', vote=0):
+        return Recipe.objects.create(name=name, ingredients=ingredients, description=description,
+                                     preparation_time=10, vote=vote)
+
+    def test_matches_all_words_by_prefix(self):
+        soup = self.create_recipe('Zupa pomidorowa', ingredients='Pomidory, bulion')
+        self.create_recipe('Zupa ogórkowa', ingredients='Ogórki kiszone')
+        self.assertEqual(search_recipes('zupa pomidor'), [soup])
+        self.assertEqual(search_recipes('"; DROP TABLE --'), [])
+
+    def test_name_matches_and_votes_rank_higher(self):
+        in_description = self.create_recipe('Sałatka', description='Z dodatkiem makaronu')
+        in_name = self.create_recipe('Makaron z sosem')
+        popular = self.create_recipe('Makaron z serem', vote=50)
+        self.assertEqual(search_recipes('makaron'), [popular, in_name, in_description])
+
+    def test_index_follows_edits_and_deletes(self):
+        recipe = self.create_recipe('Placki')
+        recipe.name = 'Naleśniki'
+        recipe.save()
+        self.assertEqual(search_recipes('placki'), [])
+        self.assertEqual(search_recipes('naleśniki'), [recipe])
+        recipe.delete()
+        self.assertEqual(search_recipes('naleśniki'), [])
+
+    def test_rebuild_indexes_bulk_created_recipes(self):
+        Recipe.objects.bulk_create([Recipe(name='Gulasz %s' % i, ingredients='Wołowina', description='Opis',
+                                           preparation_time=60) for i in range(5)])
+        self.assertEqual(search_recipes('gulasz'), [])
+        self.assertEqual(rebuild_index(batch_size=2), 5)
+        self.assertEqual(len(search_recipes('wołowina')), 5)
+
+    @skipUnless(connection.vendor == 'sqlite', "FTS5 table of SQLite")
+    def test_rebuild_keeps_the_index_complete_and_drops_stale_rows(self):
+        recipes = [self.create_recipe('Bigos %s' % i) for i in range(5)]
+        with connection.cursor() as cursor:
+            for rowid in (recipes[2].id, recipes[-1].id + 10):
+                Recipe.objects.filter(id=rowid).delete()
+                cursor.execute("INSERT OR REPLACE INTO jedzonko_recipe_fts (rowid, name, ingredients, description) "
+                               "VALUES (%s, 'Bigos stary', '', '')", [rowid])
+        found = []
+        index_recipe_range = search.index_recipe_range
+
+        def index_and_search(first_id, last_id):
+            found.append(len(search_recipes('bigos')))
+            index_recipe_range(first_id, last_id)
+
+        with mock.patch('jedzonko.search.index_recipe_range', index_and_search):
+            self.assertEqual(rebuild_index(batch_size=2), 4)
+        self.assertEqual(found, [4, 4])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM jedzonko_recipe_fts ORDER BY rowid")
+            self.assertEqual([row[0] for row in cursor.fetchall()],
+                             [recipe.id for recipe in recipes if recipe.id != recipes[2].id])
+
+    def test_list_view_filters_by_query(self):
+        self.create_recipe('Bigos')
+        self.create_recipe('Pierogi')
+        response = self.client.get(reverse('recipe_list'), {'q': 'bigos'})
+        self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Bigos'])
+
+
+class IngredientParserTest(TestCase):
+    def test_parses_quantities_and_units(self):
+        self.assertEqual(parse_ingredients('200 g mąki, 2 jajka\nmleko - 0,5 l; 1 1/2 łyżki cukru\nSól'), [
+            ParsedIngredient('mąki', Decimal('200'), 'g'),
+            ParsedIngredient('jajka', Decimal('2'), ''),
+            ParsedIngredient('mleko', Decimal('0.5'), 'l'),
+            ParsedIngredient('cukru', Decimal('1.5'), 'łyżka'),
+            ParsedIngredient('sól', None, ''),
+        ])
+
+    def test_ignores_empty_items(self):
+        self.assertEqual(parse_ingredients(' ,\n- \n'), [])
+
+    def test_ranges_keep_their_upper_bound(self):
+        self.assertEqual(parse_ingredients('3-4 jajka; 2 – 3 łyżki cukru; mąka 200-250 g'), [
+            ParsedIngredient('jajka', Decimal('4'), ''),
+            ParsedIngredient('cukru', Decimal('3'), 'łyżka'),
+            ParsedIngredient('mąka', Decimal('250'), 'g'),
+        ])
+
+    def test_quantity_too_large_for_the_field_is_dropped(self):
+        self.assertEqual(parse_ingredients('10000000 g soli; 9999999,999 g cukru'), [
+            ParsedIngredient('soli', None, ''),
+            ParsedIngredient('cukru', Decimal('9999999.999'), 'g'),
+        ])
+        recipe = Recipe.objects.create(name='Sól', ingredients='123456789012345 g soli',
+                                       description='Opis', preparation_time=1)
+        self.assertEqual(list(recipe.recipe_ingredients.values_list('quantity', 'unit')), [(None, '')])
+
+    def test_lines_without_a_name_and_brackets(self):
+        self.assertEqual(parse_ingredients('5 kg; pieprz (szczypta); (sól); woda (1 l); cukier ('), [
+            ParsedIngredient('5 kg', None, ''),
+            ParsedIngredient('pieprz (szczypta)', None, ''),
+            ParsedIngredient('sól', None, ''),
+            ParsedIngredient('woda', Decimal('1'), 'l'),
+            ParsedIngredient('cukier', None, ''),
+        ])
+
+    def test_long_lines_are_parsed_in_linear_time(self):
+        start = time.perf_counter()
+        for line in ('a' + ' ' * 8000 + 'x', 'a' + ' -' * 8000 + '1', '(' * 4000 + 'a' + ')' * 4000):
+            parse_ingredients(line)
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+    def test_recipes_are_found_by_ingredient(self):
+        pancakes = Recipe.objects.create(name='Naleśniki', ingredients='Mąka, mleko, 2 jajka',
+                                         description='Opis', preparation_time=20)
+        Recipe.objects.create(name='Omlet', ingredients='2 jajka, szczypiorek', description='Opis',
+                              preparation_time=10)
+        self.assertEqual(list(Recipe.objects.with_ingredient('Mleko')), [pancakes])
+        self.assertEqual(Recipe.objects.with_ingredient('jajka').count(), 2)
+
+        pancakes.ingredients = 'Mąka, woda'
+        pancakes.save()
+        self.assertFalse(Recipe.objects.with_ingredient('mleko').exists())
+        self.assertEqual([str(item.ingredient) for item in pancakes.recipe_ingredients.order_by('position')],
+                         ['mąka', 'woda'])
+
+
+class ShoppingListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plan = Plan.objects.create(name='Plan', description='Opis')
+        self.pancakes = Recipe.objects.create(name='Naleśniki', ingredients='200 g mąki, 0,5 l mleka, 2 jajka',
+                                              description='Opis', preparation_time=20)
+        self.bread = Recipe.objects.create(name='Chleb', ingredients='500 g mąki, woda, sól',
+                                           description='Opis', preparation_time=90)
+        for recipe, day in ((self.pancakes, DayName.MON), (self.pancakes, DayName.WED), (self.bread, DayName.MON)):
+            RecipePlan.objects.create(recipe=recipe, plan=self.plan, meal_name='Posiłek', meal_order=1,
+                                      weekday=day.weekday)
+        other = Plan.objects.create(name='Inny plan', description='Opis')
+        RecipePlan.objects.create(recipe=self.pancakes, plan=other, meal_name='Posiłek', meal_order=1,
+                                  weekday=DayName.SUN.weekday)
+
+    def test_sums_quantities_per_ingredient_and_unit(self):
+        items = {item['name']: (item['quantity'], item['unit'], item['meals']) for item in shopping_list(self.plan)}
+        self.assertEqual(items['mąki'], (Decimal('900'), 'g', 3))
+        self.assertEqual(items['mleka'], (Decimal('1'), 'l', 2))
+        self.assertEqual(items['sól'], (None, '', 1))
+
+    def test_per_day(self):
+        days = dict(shopping_list(self.plan, per_day=True))
+        self.assertEqual(list(days), [DayName.MON.value, DayName.WED.value])
+        self.assertEqual({item['name']: item['quantity'] for item in days[DayName.MON.value]}['mąki'],
+                         Decimal('700'))
+
+    def test_cached_until_meals_or_recipes_change(self):
+        url = reverse('shopping_list', kwargs={'id': self.plan.id})
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        self.bread.ingredients = '1 kg mąki'
+        self.bread.save()
+        response = self.client.get(url)
+        self.assertIn({'name': 'mąki', 'unit': 'kg', 'quantity': Decimal('1'), 'meals': 1},
+                      response.context['shopping_list'])
+
+        RecipePlan.objects.filter(recipe=self.bread).get().delete()
+        response = self.client.get(url)
+        self.assertNotIn('kg', [item['unit'] for item in response.context['shopping_list']])
+
+
+class RecipeImportExportTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_export_and_import_round_trip(self):
+        for i in range(5):
+            Recipe.objects.create(name='Przepis %s' % i, ingredients='%s jajka' % (i + 1), description='Opis',
+                                  preparation_time=10 + i, vote=i)
+        for day, recipe_id in enumerate(Recipe.objects.values_list('id', flat=True), start=1):
+            Recipe.objects.filter(id=recipe_id).update(updated=datetime(2020, 1, day, 12))
+        updated = dict(Recipe.objects.values_list('name', 'updated'))
+        for name in ('recipes.jsonl', 'recipes.csv'):
+            call_command('export_recipes', self.path(name), stderr=io.StringIO())
+        Recipe.objects.all().delete()
+
+        call_command('import_recipes', self.path('recipes.jsonl'), batch_size=2, stdout=io.StringIO(),
+                     stderr=io.StringIO())
+        call_command('import_recipes', self.path('recipes.csv'), batch_size=2, stdout=io.StringIO(),
+                     stderr=io.StringIO())
+        self.assertEqual(Recipe.objects.filter(name='Przepis 3', preparation_time=13, vote=3).count(), 2)
+        for name, time in Recipe.objects.values_list('name', 'updated'):
+            self.assertEqual(time, updated[name])
+        self.assertEqual(Recipe.objects.with_ingredient('jajka').count(), 10)
+        self.assertEqual(len(search_recipes('przepis')), 10)
+
+    def test_invalid_rows_are_skipped_and_import_resumes(self):
+        with open(self.path('recipes.jsonl'), 'w') as source:
+            source.write('{"name": "Pierwszy", "ingredients": "-", "description": "-", "preparation_time": 5}\n')
+            source.write('{"name": "Zły", "ingredients": "-", "description": "-", "preparation_time": "x"}\n')
+            source.write('nie json\n')
+            source.write('{"name": "Drugi", "ingredients": "-", "description": "-", "preparation_time": 5}\n')
+        with open(self.path('recipes.jsonl.progress'), 'w') as progress:
+            progress.write('1')
+
+        errors = io.StringIO()
+        call_command('import_recipes', self.path('recipes.jsonl'), resume=True, stdout=io.StringIO(),
+                     stderr=errors)
+        self.assertEqual(list(Recipe.objects.values_list('name', flat=True)), ['Drugi'])
+        self.assertIn('Row 2 skipped', errors.getvalue())
+        self.assertIn('Row 3 skipped', errors.getvalue())
+        self.assertFalse(os.path.exists(self.path('recipes.jsonl.progress')))
+
+
+    def test_created_recipes_get_their_own_ids(self):
+        recipes = [Recipe(name='Przepis %s' % i, ingredients='%s jajka' % (i + 1), description='Opis',
+                          preparation_time=10) for i in range(3)]
+        Recipe.objects.create(name='Wcześniejszy', ingredients='Woda', description='Opis', preparation_time=1)
+        create_recipes(recipes)
+        self.assertEqual([Recipe.objects.get(id=recipe.id).name for recipe in recipes],
+                         ['Przepis 0', 'Przepis 1', 'Przepis 2'])
+        self.assertEqual(get_counts('recipe'), {'recipe': 4})
+        self.assertEqual(Recipe.objects.with_ingredient('jajka').count(), 3)
+
+
+class PlanCloneTest(TestCase):
+    def setUp(self):
+        self.plan = Plan.objects.create(name='Plan', description='Opis')
+        self.recipe = Recipe.objects.create(name='Przepis', ingredients='Składniki', description='Opis',
+                                            preparation_time=10)
+        for day in (DayName.MON, DayName.SAT, DayName.SUN):
+            RecipePlan.objects.create(recipe=self.recipe, plan=self.plan, meal_name='Obiad %s' % day.name,
+                                      meal_order=1, weekday=day.weekday)
+
+    def meals(self, plan):
+        return sorted(plan.recipeplan_set.values_list('meal_name', 'weekday'))
+
+    def test_clone_copies_meals_with_one_read_and_one_insert(self):
+        with self.assertNumQueries(7):
+            copy = self.plan.clone(name='Kopia')
+        self.assertEqual(copy.name, 'Kopia')
+        self.assertEqual(self.meals(copy), self.meals(self.plan))
+
+    def test_clone_shifts_and_remaps_days(self):
+        copy = self.plan.clone(shift_days=1, day_map={DayName.TUE: DayName.WED})
+        self.assertEqual(self.meals(copy), [('Obiad MON', DayName.WED.weekday), ('Obiad SAT', DayName.SUN.weekday),
+                                            ('Obiad SUN', DayName.MON.weekday)])
+
+    def test_clone_view_and_command(self):
+        response = self.client.post(reverse('clone_plan', kwargs={'id': self.plan.id}),
+                                    {'name': 'Z widoku', 'shift_days': '2'})
+        copy = Plan.objects.get(name='Z widoku')
+        self.assertRedirects(response, reverse('plan_details', kwargs={'id': copy.id}))
+        self.assertIn(('Obiad SAT', DayName.MON.weekday), self.meals(copy))
+
+        call_command('clone_plan', self.plan.id, name='Z komendy', map=['sun=mon'], stdout=io.StringIO())
+        self.assertIn(('Obiad SUN', DayName.MON.weekday), self.meals(Plan.objects.get(name='Z komendy')))
+
+
+class QueryPlanTest(TestCase):
+    def test_no_view_query_needs_a_full_scan_with_a_sort(self):
+        call_command('explain_views', stdout=io.StringIO())
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plan = create_plan_with_meals(1)
+        self.url = reverse('plan_details', kwargs={'id': self.plan.id})
+
+    def test_plan_week_is_rendered_once_per_version(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+        recipe = self.plan.recipeplan_set.get(weekday=DayName.FRI.weekday).recipe
+        recipe.name = 'Nowa nazwa'
+        recipe.save()
+        with self.assertNumQueries(2):
+            self.assertContains(self.client.get(self.url), 'Nowa nazwa')
+
+    @override_settings(FRAGMENT_CACHE_TIMEOUT=0)
+    def test_fragments_follow_the_timeout_setting(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_bumps_do_not_read_the_current_version(self):
+        seen = {get_version('plan', self.plan.id)}
+        # A bump that read the version and wrote it back plus one could lose a concurrent bump.
+        with mock.patch.object(cache, 'get', side_effect=AssertionError), \
+                mock.patch.object(cache, 'incr', side_effect=AssertionError):
+            versions.bump_versions('plan', [self.plan.id])
+        seen.add(get_version('plan', self.plan.id))
+        versions.bump_versions('plan', [self.plan.id])
+        seen.add(get_version('plan', self.plan.id))
+        self.assertEqual(len(seen), 3)
+
+    def test_edit_of_a_recipe_keeps_other_plans_cached(self):
+        other = Plan.objects.create(name='Inny', description='Opis')
+        other_url = reverse('plan_details', kwargs={'id': other.id})
+        self.client.get(other_url)
+        recipe = self.plan.recipeplan_set.first().recipe
+        recipe.save()
+        with self.assertNumQueries(1):
+            self.client.get(other_url)
+
+    def test_edit_of_a_recipe_parses_it_once_and_marks_its_plans_changed(self):
+        version = get_version('plan', self.plan.id)
+        Plan.objects.filter(id=self.plan.id).update(updated=datetime(2020, 1, 1))
+        recipe = self.plan.recipeplan_set.first().recipe
+        recipe.ingredients = 'mąka 200 g\njajka 2'
+        with mock.patch('jedzonko.ingredients.parse_ingredients', wraps=parse_ingredients) as parse, \
+                mock.patch('jedzonko.similar.parse_ingredients', wraps=parse_ingredients) as parse_again:
+            recipe.save()
+        self.assertEqual(parse.call_count + parse_again.call_count, 1)
+        self.assertTrue(RecipeSignature.objects.filter(recipe=recipe).exists())
+        self.assertNotEqual(get_version('plan', self.plan.id), version)
+        self.assertGreater(Plan.objects.get(id=self.plan.id).updated, datetime(2020, 1, 1))
+
+    def test_added_meal_invalidates_dashboard(self):
+        self.client.get(reverse('dashboard'))
+        RecipePlan.objects.create(recipe=Recipe.objects.first(), plan=self.plan, meal_name='Podwieczorek',
+                                  meal_order=9, weekday=DayName.SUN.weekday)
+        self.assertContains(self.client.get(reverse('dashboard')), 'Podwieczorek')
+
+    def test_recipe_body_follows_edits(self):
+        recipe = Recipe.objects.first()
+        url = reverse('recipe_details', kwargs={'id': recipe.id})
+        self.client.get(url)
+        recipe.how_to_prepare = 'Ugotować'
+        recipe.save()
+        self.assertContains(self.client.get(url), 'Ugotować')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                           'LOCATION': os.path.join(tempfile.gettempdir(), 'jedzonko-tests')}})
+    def test_file_based_cache(self):
+        cache.clear()
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        RecipePlan.objects.get(plan=self.plan, weekday=DayName.MON.weekday).delete()
+        self.assertNotContains(self.client.get(self.url), 'Przepis MON 1')
+        cache.clear()
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plan = create_plan_with_meals(1)
+        self.recipe = Recipe.objects.first()
+
+    def assertNotModifiedAfterOneQuery(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        return response
+
+    def test_recipe_details(self):
+        url = reverse('recipe_details', kwargs={'id': self.recipe.id})
+        etag = self.assertNotModifiedAfterOneQuery(url)['ETag']
+        self.client.post(url, {'vote': 1})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_recipe_if_modified_since(self):
+        url = reverse('recipe_details', kwargs={'id': self.recipe.id})
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_plan_details_change_with_meals_and_recipes(self):
+        url = reverse('plan_details', kwargs={'id': self.plan.id})
+        etag = self.assertNotModifiedAfterOneQuery(url)['ETag']
+
+        recipe = self.plan.recipeplan_set.first().recipe
+        recipe.name = 'Zmieniony'
+        recipe.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        RecipePlan.objects.filter(plan=self.plan).first().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_missing_objects_are_404(self):
+        self.assertEqual(self.client.get(reverse('recipe_details', kwargs={'id': 999})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('plan_details', kwargs={'id': 999})).status_code, 404)
+
+
+class JsonApiTest(TestCase):
+    def setUp(self):
+        self.plan = create_plan_with_meals(2)
+        self.recipe = Recipe.objects.first()
+
+    def get_json(self, url):
+        response = self.client.get(url)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, json.loads(content.decode())
+
+    def test_recipe_list_streams_light_fields_by_default(self):
+        with CaptureQueriesContext(connection) as queries:
+            response, recipes = self.get_json(reverse('api_recipe_list'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(recipes), Recipe.objects.count())
+        self.assertNotIn('how_to_prepare', recipes[0])
+        self.assertFalse(any('how_to_prepare' in query['sql'] for query in queries))
+
+    def test_fields_projection(self):
+        url = reverse('api_recipe_list') + '?fields=id,how_to_prepare&limit=1&after=%s' % (self.recipe.id - 1)
+        response, recipes = self.get_json(url)
+        self.assertEqual(recipes, [{'id': self.recipe.id, 'how_to_prepare': self.recipe.how_to_prepare}])
+
+        response, recipe = self.get_json(reverse('api_recipe', kwargs={'id': self.recipe.id}) + '?fields=name')
+        self.assertEqual(recipe, {'name': self.recipe.name})
+
+    def test_unknown_field_and_missing_object(self):
+        response, body = self.get_json(reverse('api_recipe_list') + '?fields=password')
+        self.assertEqual(response.status_code, 400)
+        response, body = self.get_json(reverse('api_plan', kwargs={'id': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_plan_list_and_week(self):
+        response, plans = self.get_json(reverse('api_plan_list'))
+        self.assertEqual([plan['id'] for plan in plans], [self.plan.id])
+
+        with self.assertNumQueries(2):
+            response, week = self.get_json(reverse('api_plan_week', kwargs={'id': self.plan.id}))
+        self.assertEqual([day['day'] for day in week['days']], [day.value for day in DayName])
+        self.assertEqual([len(day['meals']) for day in week['days']], [2] * len(DayName))
+        self.assertEqual(set(week['days'][0]['meals'][0]['recipe']), {'id', 'name'})
+
+
+
+class MealGridTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plan = Plan.objects.create(name='Plan', description='Opis')
+        self.recipes = [Recipe.objects.create(name='Przepis %d' % number, ingredients='Składniki', description='Opis',
+                                              preparation_time=10) for number in range(5)]
+        self.url = reverse('api_plan_meals', kwargs={'id': self.plan.id})
+
+    def post_json(self, body):
+        response = self.client.post(self.url, json.dumps(body), content_type='application/json')
+        return response, json.loads(response.content.decode())
+
+    def week(self, meals_per_day):
+        return [{'day': day, 'order': order, 'recipe_id': self.recipes[order - 1].id}
+                for day in range(len(DayName)) for order in range(1, meals_per_day + 1)]
+
+    def test_week_is_added_with_a_constant_number_of_queries(self):
+        version = get_version('plan', self.plan.id)
+        with CaptureQueriesContext(connection) as small:
+            self.post_json({'meals': self.week(1)})
+        with CaptureQueriesContext(connection) as large:
+            response, body = self.post_json({'meals': self.week(5)})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(body['meals']), 35)
+        self.assertEqual(body['meals'][0], {'day': DayName.MON.value, 'meal_name': 'Śniadanie', 'meal_order': 1,
+                                            'recipe_id': self.recipes[0].id})
+
+        week = self.plan.week()
+        self.assertEqual([len(meals) for day, meals in week], [6] * len(DayName))
+        self.assertEqual([meal.meal_name for meal in week[0][1]][:3], ['Śniadanie', 'Śniadanie', 'Drugie śniadanie'])
+        self.assertNotEqual(get_version('plan', self.plan.id), version)
+        self.assertGreater(Plan.objects.get(id=self.plan.id).updated, self.plan.updated)
+
+    def test_invalid_cells_are_reported_and_nothing_is_added(self):
+        cells = [
+            {'day': 'MON', 'order': 1, 'recipe_id': self.recipes[0].id},
+            {'day': 7, 'order': 1, 'recipe_id': self.recipes[0].id},
+            {'day': 'mon', 'order': 1, 'recipe_id': 999999},
+            {'day': 'SUN', 'order': 0, 'meal_name': 'x' * 300},
+        ]
+        with self.assertNumQueries(2):
+            response, body = self.post_json({'meals': cells})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual({error['cell']: set(error['errors']) for error in body['errors']},
+                         {1: {'day'}, 2: {'order', 'recipe_id'}, 3: {'order', 'meal_name', 'recipe_id'}})
+        self.assertFalse(self.plan.recipeplan_set.exists())
+
+        response, body = self.post_json({'meals': []})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', body)
+        response = self.client.post(self.url, 'nie json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(reverse('api_plan_meals', kwargs={'id': 999}), '{}',
+                                          content_type='application/json').status_code, 404)
+
+    def test_add_recipe_to_plan_form(self):
+        form = {'choosePlan': self.plan.id, 'recipie': self.recipes[1].id, 'name': 'Kolacja', 'number': '3',
+                'day': str(DayName.FRI.weekday)}
+        response = self.client.post(reverse('add_recipe_to_plan'), form)
+        self.assertRedirects(response, reverse('plan_details', kwargs={'id': self.plan.id}))
+        self.assertEqual(list(self.plan.recipeplan_set.values_list('meal_name', 'meal_order', 'weekday')),
+                         [('Kolacja', 3, DayName.FRI.weekday)])
+
+        response = self.client.post(reverse('add_recipe_to_plan'), dict(form, recipie='999999'))
+        self.assertContains(response, 'Nie ma przepisu 999999')
+        self.assertEqual(self.plan.recipeplan_set.count(), 1)
+
+        response = self.client.post(reverse('add_recipe_to_plan'), dict(form, choosePlan='999999'))
+        self.assertContains(response, 'Nie ma planu 999999')
+
+    def test_missing_plan_is_an_error_of_the_grid(self):
+        with self.assertRaises(MealGridError) as context:
+            add_meals(999999, self.week(1))
+        self.assertEqual(context.exception.messages(), ['Nie ma planu 999999'])
+        self.assertFalse(RecipePlan.objects.exists())
+
+
+class PlanExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plan = create_plan_with_meals(2)
+
+    def export(self, format, **headers):
+        response = self.client.get(reverse('plan_export_' + format, kwargs={'id': self.plan.id}), **headers)
+        content = b''.join(response.streaming_content).decode() if response.streaming else ''
+        return response, content
+
+    def test_csv_rows_in_week_order(self):
+        response, content = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = content.splitlines()
+        self.assertEqual(rows[0], 'day_name,meal_order,meal_name,recipe_id,recipe_name,preparation_time')
+        self.assertEqual([row.split(',')[0] for row in rows[1::2]], [day.value for day in DayName])
+        self.assertTrue(rows[1].startswith('Poniedziałek,1,Posiłek 1,'))
+        self.assertTrue(rows[2].startswith('Poniedziałek,2,Posiłek 2,'))
+
+    def test_ics_events(self):
+        response, content = self.export('ics')
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(content.count('BEGIN:VEVENT'), 14)
+        self.assertIn('SUMMARY:Posiłek 1: Przepis MON 1\r\n', content)
+        self.assertIn('RRULE:FREQ=WEEKLY\r\n', content)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in content.split('\r\n')))
+
+    def test_repeated_fetches_are_served_from_cache(self):
+        response, content = self.export('ics')
+        with self.assertNumQueries(1):
+            again, cached = self.export('ics')
+        self.assertEqual(cached, content)
+        with self.assertNumQueries(1):
+            not_modified, _ = self.export('ics', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        RecipePlan.objects.filter(plan=self.plan).first().delete()
+        response, content = self.export('ics', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content.count('BEGIN:VEVENT'), 13)
+
+    def test_missing_plan(self):
+        response = self.client.get(reverse('plan_export_csv', kwargs={'id': 999}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('plan_export_csv', kwargs={'id': 999}), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(cache.get(versions.KEY % ('plan', 999)))
+
+
+class ViewPerformanceTest(TestCase):
+    """
+    Query-count and response-time budgets of every URL in scrumlab/urls.py.
+
+    Every URL is requested with an empty cache at two data sizes made by
+    seed_data. A view whose query count grows with the data fails even when it
+    stays under its budget.
+    """
+    # (recipes, plans, meals per plan); the second seed adds to the first.
+    SIZES = ((20, 3, 7), (200, 30, 35))
+    MAX_SECONDS = 1.0
+    # URL name: (method, object the id refers to, maximum number of queries)
+    BUDGETS = {
+        'index': ('get', None, 3),
+        'dashboard': ('get', None, 3),
+        'login': ('get', None, 0),
+        'register': ('get', None, 0),
+        'recipe_details': ('get', 'recipe', 3),
+        'recipe_list': ('get', None, 2),
+        'add_recipe': ('get', None, 0),
+        'modify_recipe': ('get', 'recipe', 1),
+        'add_plan': ('get', None, 0),
+        'add_recipe_to_plan': ('get', None, 2),
+        'generate_plan': ('get', None, 0),
+        'plan_list': ('get', None, 2),
+        'plan_details': ('get', 'plan', 2),
+        'clone_plan': ('post', 'plan', 8),
+        'shopping_list': ('get', 'plan', 2),
+        'plan_export_ics': ('get', 'plan', 2),
+        'plan_export_csv': ('get', 'plan', 2),
+        'api_recipe_list': ('get', None, 1),
+        'api_recipe': ('get', 'recipe', 1),
+        'api_plan_list': ('get', None, 1),
+        'api_plan': ('get', 'plan', 1),
+        'api_plan_week': ('get', 'plan', 2),
+        'api_plan_meals': ('post', 'plan', 7),
+    }
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in get_resolver().url_patterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(names, set(self.BUDGETS))
+
+    def request_body(self, name, ids):
+        """
+        Return the body arguments of the request to a URL that needs one.
+        """
+        if name == 'api_plan_meals':
+            cells = [{'day': day, 'order': order, 'recipe_id': ids['recipe']}
+                     for day in range(len(DayName)) for order in range(1, 6)]
+            return {'data': json.dumps({'meals': cells}), 'content_type': 'application/json'}
+        return {}
+
+    def measure(self):
+        """
+        Return {url name: (queries, seconds)} of one request to every URL.
+        """
+        ids = {
+            'recipe': Recipe.objects.order_by('-id').values_list('id', flat=True).first(),
+            'plan': Plan.objects.order_by('-id').values_list('id', flat=True).first(),
+        }
+        results = {}
+        for name, (method, model, _) in self.BUDGETS.items():
+            url = reverse(name, kwargs={'id': ids[model]} if model else None)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(self.client, method)(url, **self.request_body(name, ids))
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            self.assertLess(response.status_code, 400, url)
+            results[name] = (len(queries), elapsed)
+        return results
+
+    def test_query_counts_and_response_times(self):
+        results = []
+        for recipes, plans, meals in self.SIZES:
+            call_command('seed_data', recipes=recipes, plans=plans, meals=meals, stdout=io.StringIO())
+            results.append(self.measure())
+
+        for name, (_, _, max_queries) in self.BUDGETS.items():
+            counts = [result[name][0] for result in results]
+            with self.subTest(view=name):
+                self.assertEqual(len(set(counts)), 1,
+                                 "%s: query count grows with the data: %s for sizes %s" % (name, counts, self.SIZES))
+                self.assertLessEqual(max(counts), max_queries, "%s: more queries than budgeted" % name)
+                slowest = max(result[name][1] for result in results)
+                self.assertLess(slowest, self.MAX_SECONDS, "%s: took %.3f s" % (name, slowest))
+
+
+class TimingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.plan = create_plan_with_meals(1)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('plan_details', kwargs={'id': self.plan.id}))
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertNotIn('desc="0 queries"', header)
+        self.assertNotIn('tpl;dur=0.00', header)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0, SLOW_REQUEST_QUERIES=2)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('jedzonko.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('plan_details', kwargs={'id': self.plan.id}))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], reverse('plan_details', kwargs={'id': self.plan.id}))
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['queries'], 0)
+        self.assertEqual(len(entry['slowest_queries']), 2)
+        self.assertIn('SELECT', entry['slowest_queries'][0]['sql'])
+
+    @override_settings(TIMING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class PlanGeneratorTest(TestCase):
+    def setUp(self):
+        for number in range(30):
+            Recipe.objects.create(name='Przepis %s' % number, ingredients='-', description='-',
+                                  preparation_time=10 + number, vote=number)
+        recipe_index(reload=True)
+
+    def test_constraints(self):
+        with CaptureQueriesContext(connection) as queries:
+            plan = generate_plan('Wygenerowany', meals_per_day=3, max_day_time=90, no_repeat_days=7, seed=1)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "jedzonko_recipeplan"')]
+        self.assertEqual(len(inserts), 1)
+
+        meals = list(plan.recipeplan_set.select_related('recipe'))
+        self.assertEqual(len(meals), 21)
+        for day in DayName:
+            day_meals = [meal for meal in meals if meal.weekday == day.weekday]
+            self.assertEqual(sorted(meal.meal_order for meal in day_meals), [1, 2, 3])
+            self.assertLessEqual(sum(meal.recipe.preparation_time for meal in day_meals), 90)
+        self.assertEqual(len({meal.recipe_id for meal in meals}), 21)
+
+    def test_prefers_higher_votes(self):
+        plan = generate_plan('Wygenerowany', meals_per_day=1, no_repeat_days=1, seed=2)
+        votes = plan.recipeplan_set.values_list('recipe__vote', flat=True)
+        self.assertTrue(all(vote >= 25 for vote in votes))
+
+    def test_candidates_without_a_time_limit(self):
+        index = RecipeIndex([(1, 10, 5), (2, 500, 50), (3, None, 1)])
+        self.assertEqual(index.candidates(None, exclude={1}, limit=5), [(50, 2, 500), (1, 3, 0)])
+        self.assertEqual(index.candidates(20, exclude=set(), limit=5), [(5, 1, 10), (1, 3, 0)])
+
+    def test_impossible_constraints(self):
+        with self.assertRaises(PlanGenerationError):
+            generate_plan('Za krótko', meals_per_day=2, max_day_time=15)
+        with self.assertRaises(PlanGenerationError):
+            generate_plan('Za mało przepisów', meals_per_day=5, no_repeat_days=7)
+        self.assertFalse(Plan.objects.exists())
+
+    def test_deleted_recipes_are_not_used(self):
+        Recipe.objects.filter(vote__gte=10).delete()
+        plan = generate_plan('Wygenerowany', meals_per_day=1, no_repeat_days=1, seed=3)
+        self.assertTrue(all(vote < 10 for vote in plan.recipeplan_set.values_list('recipe__vote', flat=True)))
+
+    def test_large_index_is_fast(self):
+        import random
+        rng = random.Random(0)
+        index = RecipeIndex((number, rng.randint(5, 180), rng.randint(0, 500)) for number in range(100000))
+        start = time.perf_counter()
+        week = generate_week(index, 5, max_day_time=180, no_repeat_days=7, rng=rng)
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(len({recipe_id for _, _, recipe_id in week}), 35)
+
+    def test_view_and_command(self):
+        response = self.client.post(reverse('generate_plan'), {'name': 'Z widoku', 'meals_per_day': 2,
+                                                               'max_day_time': 80, 'no_repeat_days': 7})
+        plan = Plan.objects.get(name='Z widoku')
+        self.assertRedirects(response, reverse('plan_details', kwargs={'id': plan.id}))
+        self.assertEqual(plan.recipeplan_set.count(), 14)
+
+        response = self.client.post(reverse('generate_plan'), {'name': 'Za krótko', 'max_day_time': 5})
+        self.assertContains(response, 'Brak przepisu')
+
+        out = io.StringIO()
+        call_command('generate_plan', 'Z komendy', '--meals', '1', '--seed', '1', stdout=out)
+        self.assertIn('with 7 meals', out.getvalue())
+
+
+class SimilarRecipesTest(TestCase):
+    def create(self, name, ingredients):
+        return Recipe.objects.create(name=name, ingredients=ingredients, description='-', preparation_time=10)
+
+    def setUp(self):
+        cache.clear()
+        self.pancakes = self.create('Naleśniki', '200 g mąki, 2 jajka, 1 l mleka, szczypta soli, 50 g masła')
+        self.waffles = self.create('Gofry', '250 g mąki, 3 jajka, 1 l mleka, szczypta soli, 50 g masła, cukier')
+        self.salad = self.create('Sałatka', '3 pomidory, 1 ogórek, 1 cebula, oliwa')
+
+    def test_minhash_estimates_jaccard_similarity(self):
+        a = minhash(['mąka', 'jajka', 'mleko', 'sól'])
+        b = minhash(['mąka', 'jajka', 'mleko', 'cukier'])
+        agreement = sum(x == y for x, y in zip(a, b)) / len(a)
+        self.assertAlmostEqual(agreement, 3 / 5, delta=0.2)
+        self.assertEqual(minhash(['mąka', 'jajka']), minhash(['jajka', 'mąka']))
+        self.assertIsNone(minhash([]))
+
+    def test_similar_recipes(self):
+        similar = similar_recipes(self.pancakes.id)
+        self.assertEqual([item['id'] for item in similar], [self.waffles.id])
+        self.assertGreater(similar[0]['similarity'], 0.5)
+        self.assertEqual(similar_recipes(self.salad.id), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.salad.ingredients = '200 g mąki, 2 jajka, 1 l mleka, szczypta soli, 50 g masła'
+        self.salad.save()
+        self.assertIn(self.pancakes.id, [item['id'] for item in similar_recipes(self.salad.id)])
+        cache.clear()
+        self.assertIn(self.salad.id, [item['id'] for item in similar_recipes(self.pancakes.id)])
+        self.salad.delete()
+        self.assertFalse(RecipeBand.objects.filter(recipe_id=self.salad.id).exists())
+        cache.clear()
+        self.assertEqual([item['id'] for item in similar_recipes(self.pancakes.id)], [self.waffles.id])
+
+    def test_rebuild_command(self):
+        RecipeBand.objects.all().delete()
+        RecipeSignature.objects.all().delete()
+        call_command('rebuild_similar_index', processes=2, batch_size=2, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(RecipeSignature.objects.count(), 3)
+        self.assertEqual([item['id'] for item in similar_recipes(self.pancakes.id)], [self.waffles.id])
+
+    def test_details_page(self):
+        response = self.client.get(reverse('recipe_details', kwargs={'id': self.pancakes.id}))
+        self.assertContains(response, 'Podobne przepisy')
+        with self.assertNumQueries(0):
+            similar_recipes(self.pancakes.id)
+        self.assertContains(response, reverse('recipe_details', kwargs={'id': self.waffles.id}))
+
+
+@override_settings(DATABASE_REPLICAS=['test-replica'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTest(TestCase):
+    """
+    Routing decisions, checked through QuerySet.db, so the replica alias needs no database.
+    """
+    def request(self, method='get', cookies=None, write=False):
+        """
+        Pass a request through ReplicaMiddleware and return the alias its reads went to, and the response.
+        """
+        seen = {}
+
+        def view(request):
+            if write:
+                Recipe.objects.create(name='Nowy', ingredients='-', description='-', preparation_time=1)
+            seen['read'] = Recipe.objects.all().db
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaMiddleware(view)(request)
+        return seen['read'], response
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(Recipe.objects.all().db, 'default')
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_get_reads_from_replica(self):
+        alias, response = self.request()
+        self.assertEqual(alias, 'test-replica')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_post_sticks_to_primary(self):
+        alias, response = self.request('post')
+        self.assertEqual(alias, 'default')
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+
+        self.assertEqual(self.request(cookies={STICKY_COOKIE: cookie.value})[0], 'default')
+        self.assertEqual(self.request(cookies={STICKY_COOKIE: str(int(time.time()) - 1)})[0], 'test-replica')
+        self.assertEqual(self.request(cookies={STICKY_COOKIE: 'x'})[0], 'test-replica')
+
+    def test_streaming_body_reads_from_the_replica_of_the_view(self):
+        def view(request):
+            return StreamingHttpResponse(Recipe.objects.all().db for _ in range(2))
+
+        response = ReplicaMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(list(response.streaming_content), [b'test-replica', b'test-replica'])
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_reads_after_a_write_in_the_request_use_the_primary(self):
+        self.assertEqual(self.request(write=True)[0], 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        alias, response = self.request('post')
+        self.assertEqual(alias, 'default')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_vote_sets_sticky_cookie(self):
+        recipe = Recipe.objects.create(name='Przepis', ingredients='-', description='-', preparation_time=1)
+        response = self.client.post(reverse('recipe_details', kwargs={'id': recipe.id}), {'vote': 1})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+
+class RowCountTest(TestCase):
+    def test_counts_follow_saves_deletes_and_bulk_inserts(self):
+        plan = create_plan_with_meals(1)
+        self.assertEqual(get_counts('recipe', 'plan'), {'recipe': 7, 'plan': 1})
+
+        Recipe.objects.filter(id__in=Recipe.objects.values('id')[:2]).delete()
+        plan.clone()
+        plan.recipeplan_set.first().recipe.save()
+        call_command('seed_data', recipes=3, plans=2, meals=1, stdout=io.StringIO())
+        self.assertEqual(get_counts('recipe', 'plan'), {'recipe': 8, 'plan': 4})
+
+    def test_reconcile_fixes_drift(self):
+        create_plan_with_meals(1)
+        RowCount.objects.filter(name='recipe').update(count=100)
+        RowCount.objects.filter(name='plan').delete()
+        out = io.StringIO()
+        call_command('reconcile_counts', stdout=out)
+        self.assertIn('recipe: 7 (was 100)', out.getvalue())
+        self.assertEqual(get_counts('recipe', 'plan'), {'recipe': 7, 'plan': 1})
+
+    def test_views_read_counters(self):
+        create_plan_with_meals(1)
+        RowCount.objects.filter(name='recipe').update(count=42)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['list_recipes'], 42)
+        self.assertEqual(response.context['list_plans'], 1)
+
+    def test_view_rolls_back_the_row_when_the_counter_fails(self):
+        get_counts('plan')
+        with mock.patch('jedzonko.signals.add', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('add_plan'), {'name': 'Plan', 'description': 'Opis'})
+        self.assertFalse(Plan.objects.exists())
+        self.assertEqual(get_counts('plan'), {'plan': 0})
+
+
+@override_settings(STATIC_ROOT=os.path.join(tempfile.gettempdir(), 'jedzonko-static'))
+class StaticFilesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, clear=True, verbosity=0)
+        with open(os.path.join(settings.STATIC_ROOT, 'staticfiles.json')) as manifest:
+            cls.paths = json.load(manifest)['paths']
+        cls.app = StaticFilesApp(lambda environ, start_response: [b'django'])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.STATIC_ROOT)
+        super().tearDownClass()
+
+    def request(self, path, method='GET', **headers):
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': method}
+        environ.update(('HTTP_' + name.upper(), value) for name, value in headers.items())
+        response = {}
+
+        def start_response(status, response_headers):
+            response['status'] = status
+            response['headers'] = dict(response_headers)
+
+        body = self.app(environ, start_response)
+        response['body'] = b''.join(body)
+        getattr(body, 'close', lambda: None)()
+        return response
+
+    def test_collected_files_are_hashed_and_compressed(self):
+        stylesheet = self.paths['css/style.css']
+        self.assertRegex(stylesheet, r'^css/style\.[0-9a-f]{12}\.css$')
+        path = os.path.join(settings.STATIC_ROOT, stylesheet)
+        with open(path, 'rb') as original, gzip.open(path + '.gz') as compressed:
+            content = original.read()
+            self.assertEqual(compressed.read(), content)
+        self.assertIn(self.paths['images/image.png'].encode(), content)
+        self.assertFalse(os.path.exists(os.path.join(settings.STATIC_ROOT, self.paths['images/image.png']) + '.gz'))
+
+    def test_hashed_files_are_immutable_and_negotiated(self):
+        url = settings.STATIC_URL + self.paths['css/style.css']
+        compressed = self.request(url, accept_encoding='br;q=0, gzip')
+        self.assertEqual(compressed['status'], '200 OK')
+        self.assertEqual(compressed['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed['headers']['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(compressed['headers']['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(compressed['body']), self.request(url)['body'])
+
+        plain = self.request(url, accept_encoding='identity')
+        self.assertNotIn('Content-Encoding', plain['headers'])
+        self.assertEqual(int(plain['headers']['Content-Length']), len(plain['body']))
+
+        cached = self.request(url, accept_encoding='gzip', if_none_match=compressed['headers']['ETag'])
+        self.assertEqual((cached['status'], cached['body']), ('304 Not Modified', b''))
+        self.assertEqual(self.request(url, method='HEAD')['body'], b'')
+
+    def test_plain_names_and_other_paths(self):
+        plain = self.request(settings.STATIC_URL + 'css/style.css')
+        self.assertEqual(plain['headers']['Cache-Control'], 'public, max-age=%d' % settings.STATIC_MAX_AGE)
+        self.assertEqual(self.request(settings.STATIC_URL + 'css/missing.css')['body'], b'django')
+        self.assertEqual(self.request('/')['body'], b'django')
+
+    def test_pages_link_hashed_files(self):
+        self.assertContains(self.client.get(reverse('index')), settings.STATIC_URL + self.paths['css/style.css'])
+
+
+class WarmupTest(TestCase):
+    cached_templates = [dict(settings.TEMPLATES[0], OPTIONS=dict(settings.TEMPLATES[0]['OPTIONS'], loaders=[
+        ('django.template.loaders.cached.Loader', settings.TEMPLATES[0]['OPTIONS']['loaders']),
+    ]))]
+
+    def test_templates_are_compiled_once_per_process(self):
+        with override_settings(TEMPLATES=self.cached_templates):
+            timings = {step: count for step, count, _ in warmup()}
+            cached = engines.all()[0].engine.template_loaders[0].get_template_cache
+            self.assertIn('dashboard.html', cached)
+            self.assertEqual(timings['templates'], len(cached))
+
+            with mock.patch('django.template.loaders.filesystem.Loader.get_contents') as get_contents:
+                self.assertEqual(self.client.get(reverse('index')).status_code, 200)
+            get_contents.assert_not_called()
+
+    def test_urls_and_databases(self):
+        timings = {step: count for step, count, _ in warmup()}
+        self.assertGreaterEqual(timings['urls'], len(ViewPerformanceTest.BUDGETS))
+        self.assertNotIn('databases', timings)
+        timings = {step: count for step, count, _ in warmup(databases=True)}
+        self.assertEqual(timings['databases'], 1)
+        self.assertIsNotNone(connection.connection)
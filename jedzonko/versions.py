@@ -0,0 +1,58 @@
+"""
+Versions of recipes and plans, used as parts of cache keys.
+
+Anything cached for an object, like a rendered template fragment or a shopping
+list, includes the object's version in its key. jedzonko.signals bumps the
+version when the object changes, so the next request computes a fresh value and
+the old entry is never read again and expires on its own. Every version is a new
+random value rather than the previous one plus one: two bumps at the same time
+still leave a version no request has cached under (the file-based cache has no
+atomic increment), and a version evicted from the cache cannot come back.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from jedzonko.models import Plan
+
+KEY = 'version:%s:%s'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def get_version(model_name, pk):
+    """
+    Return the current version of the object.
+
+    Example usage:
+    >>> get_version('plan', 12)
+    '5f1c0e1e9a4b4c1f8d2a6b7e3c9d0a12'
+    """
+    key = KEY % (model_name, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(model_name, pks):
+    """
+    Move the objects to new versions.
+    """
+    if pks:
+        cache.set_many({KEY % (model_name, pk): _new_version() for pk in pks}, None)
+
+
+def bump_plan_versions(plan_ids):
+    """
+    Set the update time of the plans and move them to new versions after their meals or recipes changed.
+
+    Code writing meals with bulk_create, which sends no post_save, calls it
+    inside its transaction, like jedzonko.signals does for a saved meal.
+    """
+    Plan.objects.filter(id__in=plan_ids).update(updated=timezone.now())
+    bump_versions('plan', plan_ids)
@@ -1,13 +1,25 @@
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views import View
-from django.http import Http404, HttpResponseRedirect
-import random
-
-from jedzonko.models import Plan, Recipe, RecipePlan, DayName, Page
+from django.views.decorators.http import condition
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+
+from jedzonko.models import Plan, Recipe, DayName, Page
+from jedzonko.counters import get_counts
+from jedzonko.meal_grid import MealGridError, add_meals, parse_int
+from jedzonko.pagination import CursorPaginator
+from jedzonko.plan_export import CONTENT_TYPES, export_plan
+from jedzonko.planner import PlanGenerationError, generate_plan
+from jedzonko.search import search_recipes
+from jedzonko.shopping import shopping_list
+from jedzonko.similar import similar_recipes
+from jedzonko.versions import get_version
+from jedzonko.votes import add_vote, pending_votes
 
 
 class IndexView(View):
@@ -18,12 +30,10 @@ class IndexView(View):
     - get(self, request): Handles GET requests for the home page.
     """
     def get(self, request):
-        recipes_list = list(Recipe.objects.all())
-        random.shuffle(recipes_list)
-        carousel = recipes_list[:3]
+        carousel = Recipe.objects.only('name', 'description').sample(3)
         carousel_with_index = [(index, recipe) for index, recipe in enumerate(carousel)]
 
-        plans_count = Plan.objects.count()
+        plans_count = get_counts('plan')['plan']
 
         ctx = {
             "actual_date": datetime.now(),
@@ -48,17 +58,17 @@ class DashboardView(View):
         except Plan.DoesNotExist:
             raise Http404("No plans found")
 
-        days_of_week = [day.value for day in DayName]
-        recipe_plans = {day: RecipePlan.objects.filter(plan=latest_plan, day_name=day).order_by('meal_order')
-                        for day in days_of_week}
+        # Called by the template only when the cached week fragment is missing.
+        recipe_plans = latest_plan.week
 
-        plans_count = Plan.objects.count()
-        recipes_count = Recipe.objects.count()
+        counts = get_counts('plan', 'recipe')
 
         context = {
-            "list_plans": plans_count,
-            "list_recipes": recipes_count,
+            "list_plans": counts['plan'],
+            "list_recipes": counts['recipe'],
             'plan': latest_plan,
+            'plan_version': get_version('plan', latest_plan.id),
+            'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
             'recipe_plans': recipe_plans
         }
 
@@ -95,27 +105,26 @@ class RecipeListView(View):
     """
     View for rendering the recipe list page.
 
+    With a `q` parameter the page lists the recipes matching the query, best matches first.
+
     Methods:
     - get(self, request): Handles GET requests for the recipe list page.
     """
     def get(self, request):
         show_special_menu_item = True
 
-        all_recipes = Recipe.objects.all().order_by('-vote', '-created')
-        paginator = Paginator(all_recipes, 2)  # must be 50
-
-        page = request.GET.get('page')
-        try:
-            recipes = paginator.page(page)
-        except PageNotAnInteger:
-            recipes = paginator.page(1)
-        except EmptyPage:
-            recipes = paginator.page(paginator.num_pages)
+        query = request.GET.get('q', '').strip()
+        if query:
+            recipes = search_recipes(query)
+        else:
+            paginator = CursorPaginator(Recipe.objects.all(), 2, ('-vote', '-created', '-id'))  # must be 50
+            recipes = paginator.page(request.GET.get('cursor'))
 
         context = {
             "show_special_menu_item": show_special_menu_item,
             "recipes": recipes,
-            "paginator": paginator
+            "query": query,
+            "recipes_count": get_counts('recipe')['recipe']
         }
 
         return render(request, 'app-recipes.html', context)
@@ -156,31 +165,79 @@ class AddRecipeView(View):
                                 ingredients=ingredients,
                                 how_to_prepare=how_to_prepare
                                 )
-            new_recipe.save()
+            with transaction.atomic():
+                new_recipe.save()
             return redirect('recipe_list')
 
 
+def recipe_state(request, id):
+    """
+    Return the last update time and the buffered votes of the recipe, looked up once per request.
+    """
+    if not hasattr(request, 'recipe_state'):
+        updated = Recipe.objects.filter(id=id).values_list('updated', flat=True).first()
+        request.recipe_state = (updated, pending_votes(id))
+    return request.recipe_state
+
+
+def recipe_etag(request, id):
+    updated, pending = recipe_state(request, id)
+    return '%s-%s-%s' % (id, updated.timestamp(), pending) if updated else None
+
+
+def recipe_last_modified(request, id):
+    updated, pending = recipe_state(request, id)
+    return None if pending else updated
+
+
+def plan_last_modified(request, id):
+    """
+    Return the last update time of the plan.
+
+    The plan row is small, so it is fetched whole once per request and reused by
+    the view when the response is not a 304.
+    """
+    if not hasattr(request, 'plan'):
+        request.plan = Plan.objects.filter(pk=id).first()
+    return request.plan.updated if request.plan else None
+
+
+def plan_etag(request, id):
+    updated = plan_last_modified(request, id)
+    return '%s-%s' % (id, updated.timestamp()) if updated else None
+
+
 class RecipeDetailsView(View):
     """
     View for rendering recipe details and handling voting.
 
+    GET requests answer If-None-Match and If-Modified-Since with 304 Not Modified
+    after looking up only the recipe's update time. The page lists recipes with
+    similar ingredients, found with jedzonko.similar.
+
     Methods:
     - get(self, request, id): Handles GET requests for displaying recipe details.
     - post(self, request, id): Handles POST requests for voting on a recipe.
     """
+    @method_decorator(condition(etag_func=recipe_etag, last_modified_func=recipe_last_modified))
     def get(self, request, id):
-        recipe = Recipe.objects.filter(id=id)
+        recipe = get_object_or_404(Recipe, id=id)
         show_special_menu_item = True
-        context = {"show_special_menu_item": show_special_menu_item, 'id': id, 'recipe': recipe[0]}
+        context = {"show_special_menu_item": show_special_menu_item, 'id': id, 'recipe': recipe,
+                   'recipe_version': get_version('recipe', recipe.id),
+                   'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+                   'similar_recipes': similar_recipes(recipe.id)}
         return render(request, "app-recipe-details.html", context)
 
     def post(self, request, id):
         vote = int(request.POST.get('vote'))
-        recipe = Recipe.objects.get(id=id)
-        recipe.vote += vote
-        recipe.save()
+        recipe = get_object_or_404(Recipe, id=id)
+        recipe.vote = add_vote(recipe, vote)
         show_special_menu_item = True
-        context = {"show_special_menu_item": show_special_menu_item, 'id': id, 'recipe': recipe}
+        context = {"show_special_menu_item": show_special_menu_item, 'id': id, 'recipe': recipe,
+                   'recipe_version': get_version('recipe', recipe.id),
+                   'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+                   'similar_recipes': similar_recipes(recipe.id)}
         return render(request, "app-recipe-details.html", context)
 
 
@@ -221,7 +278,8 @@ class RecipeModifyView(View):
                                 ingredients=ingredients,
                                 how_to_prepare=how_to_prepare
                                 )
-            new_recipe.save()
+            with transaction.atomic():
+                new_recipe.save()
             return redirect('recipe_list')
 
 
@@ -249,7 +307,8 @@ class AddPlanView(View):
             error_message = 'Wypełnij opis planu'
         else:
             new_plan = Plan(name=recipe_name, description=recipe_description)
-            new_plan.save()
+            with transaction.atomic():
+                new_plan.save()
 
             return redirect('plan_details', id=new_plan.id)
 
@@ -262,53 +321,31 @@ class AddRecipeToPlanView(View):
 
     Methods:
     - get(self, request): Handles GET requests for the add recipe to plan page.
-    - post(self, request): Handles POST requests for adding a recipe to a meal plan.
+    - post(self, request): Handles POST requests for adding a recipe to a meal plan; the form is shown
+      again with the errors when a field is invalid.
     """
-    def get(self, request):
-        plans = Plan.objects.all()
-        recipes = Recipe.objects.all()
-        days = [(day.value, day.display_name()) for day in DayName]
+    def render_form(self, request, error_message=None):
+        days = [(day.weekday, day.display_name()) for day in DayName]
+        return render(request, "app-schedules-meal-recipe.html", {'plans': Plan.objects.all(),
+                                                                  'recipes': Recipe.objects.all(),
+                                                                  'days': days,
+                                                                  'error_message': error_message})
 
-        return render(request, "app-schedules-meal-recipe.html", {'plans': plans,
-                                                                  'recipes': recipes,
-                                                                  'days': days})
+    def get(self, request):
+        return self.render_form(request)
 
     def post(self, request):
-        if request.method == "POST":
-            recipe = request.POST.get('recipie')
-            plan = request.POST.get('choosePlan')
-            meal_name = request.POST.get('name')
-            meal_order = request.POST.get('number')
-            day_name = request.POST.get('day')
-
-            plan = Plan.objects.get(pk=plan)
-            recipe = Recipe.objects.get(pk=recipe)
-
-            recipe_plan = RecipePlan(recipe=recipe,
-                                     plan=plan,
-                                     meal_name=meal_name,
-                                     meal_order=meal_order,
-                                     day_name=day_name
-                                     )
-            recipe_plan.save()
-
-            return redirect('plan_details', id=plan.id)
-
-        return render(request, 'app-schedules-meal-recipe.html')
-
-    def post(self, request, error_message=None):
-
-        if request.method == "POST":
-            recipe = request.POST.get('recipie')
-            plan = request.POST.get('choosePlan')
-            meal_name = request.POST.get('name')
-            meal_order = request.POST.get('number')
-            day_name = request.POST.get('day')
-            error_message = ''
-
-            return redirect('plan/add-recipe')
-
-        return render(request, 'app-schedules-meal-recipe.html', {'error_message': error_message})
+        plan_id = parse_int(request.POST.get('choosePlan'))
+        if plan_id is None:
+            return self.render_form(request, 'Wybierz plan')
+        try:
+            add_meals(plan_id, [{'day': request.POST.get('day'),
+                                 'order': request.POST.get('number'),
+                                 'meal_name': request.POST.get('name'),
+                                 'recipe_id': request.POST.get('recipie')}])
+        except MealGridError as error:
+            return self.render_form(request, ' '.join(error.messages()))
+        return redirect('plan_details', id=plan_id)
 
 
 class PlanListView(View):
@@ -321,21 +358,13 @@ class PlanListView(View):
     def get(self, request):
         show_special_menu_item = True
 
-        all_plans = Plan.objects.all().order_by('name')
-        paginator = Paginator(all_plans, 3)  # must be 50
-
-        page = request.GET.get('page')
-        try:
-            plans = paginator.page(page)
-        except PageNotAnInteger:
-            plans = paginator.page(1)
-        except EmptyPage:
-            plans = paginator.page(paginator.num_pages)
+        paginator = CursorPaginator(Plan.objects.all(), 3, ('name', 'id'))  # must be 50
+        plans = paginator.page(request.GET.get('cursor'))
 
         context = {
             "show_special_menu_item": show_special_menu_item,
             "plans": plans,
-            "paginator": paginator
+            "plans_count": get_counts('plan')['plan']
         }
         return render(request, 'app-schedules.html', context)
 
@@ -344,15 +373,122 @@ class PlanDetailsView(View):
     """
     View for rendering meal plan details.
 
+    GET requests answer If-None-Match and If-Modified-Since with 304 Not Modified
+    after looking up only the plan's update time.
+
     Methods:
     - get(self, request, id): Handles GET requests for displaying meal plan details.
     """
+    @method_decorator(condition(etag_func=plan_etag, last_modified_func=plan_last_modified))
     def get(self, request, id):
         show_special_menu_item = True
-        plan = get_object_or_404(Plan, pk=id)
-        days = [day.value for day in DayName]
-        meals = RecipePlan.objects.filter(plan=plan).order_by('meal_order')
+        plan = getattr(request, 'plan', None) or get_object_or_404(Plan, pk=id)
+        # Called by the template only when the cached week fragment is missing.
+        week = plan.week
 
-        context = {"plan": plan, "days": days, "meals": meals, "show_special_menu_item": show_special_menu_item}
+        context = {"plan": plan, "plan_version": get_version('plan', plan.id), "week": week,
+                   "cache_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
+                   "show_special_menu_item": show_special_menu_item}
 
         return render(request, 'app-details-schedules.html', context)
+
+
+class ShoppingListView(View):
+    """
+    View for rendering the shopping list of a meal plan.
+
+    Methods:
+    - get(self, request, id): Handles GET requests for displaying the shopping list, per day with `per_day=1`.
+    """
+    def get(self, request, id):
+        plan = get_object_or_404(Plan, pk=id)
+        per_day = request.GET.get('per_day') == '1'
+
+        context = {
+            "plan": plan,
+            "per_day": per_day,
+            "shopping_list": shopping_list(plan, per_day=per_day),
+            "show_special_menu_item": True
+        }
+
+        return render(request, 'app-shopping-list.html', context)
+
+
+class ClonePlanView(View):
+    """
+    View for copying a meal plan with all its meals.
+
+    Methods:
+    - post(self, request, id): Handles POST requests for copying a meal plan, optionally shifting its days.
+    """
+    def post(self, request, id):
+        plan = get_object_or_404(Plan, pk=id)
+        try:
+            shift_days = int(request.POST.get('shift_days') or 0)
+        except ValueError:
+            shift_days = 0
+        new_plan = plan.clone(name=request.POST.get('name'), shift_days=shift_days)
+
+        return redirect('plan_details', id=new_plan.id)
+
+
+def plan_export_etag(request, id, format):
+    etag = plan_etag(request, id)
+    return '%s-%s' % (etag, format) if etag else None
+
+
+class PlanExportView(View):
+    """
+    View streaming a meal plan as an iCalendar feed or a CSV file.
+
+    The ETag comes from the plan's update time, so a calendar app polling an
+    unchanged plan gets 304 Not Modified after one query for the plan row, and a
+    fetch without If-None-Match is served from the cached export. A missing plan
+    has no ETag and is always a 404.
+
+    Methods:
+    - get(self, request, id, format): Handles GET requests for the plan in the format ('ics' or 'csv').
+    """
+    @method_decorator(condition(etag_func=plan_export_etag))
+    def get(self, request, id, format):
+        plan_last_modified(request, id)
+        if request.plan is None:
+            raise Http404("Plan not found")
+        response = StreamingHttpResponse(export_plan(request.plan, format), content_type=CONTENT_TYPES[format])
+        response['Content-Disposition'] = '%s; filename="plan-%s.%s"' % (
+            'attachment' if format == 'csv' else 'inline', id, format)
+        return response
+
+
+class GeneratePlanView(View):
+    """
+    View for generating a meal plan from the recipe catalog.
+
+    Methods:
+    - get(self, request): Handles GET requests for the plan generator form.
+    - post(self, request): Handles POST requests for generating a plan with the given number of meals per day,
+      cooking time per day and days without repeated recipes.
+    """
+    def get(self, request):
+        return render(request, 'app-generate-plan.html')
+
+    def post(self, request):
+        form = request.POST
+        try:
+            meals_per_day = int(form.get('meals_per_day') or 3)
+            max_day_time = int(form['max_day_time']) if form.get('max_day_time') else None
+            no_repeat_days = int(form.get('no_repeat_days') or 7)
+        except ValueError:
+            error_message = 'Podaj liczby całkowite'
+        else:
+            if not form.get('name'):
+                error_message = 'Wypełnij nazwę planu'
+            else:
+                try:
+                    plan = generate_plan(form['name'], meals_per_day=meals_per_day, max_day_time=max_day_time,
+                                         no_repeat_days=no_repeat_days)
+                    return redirect('plan_details', id=plan.id)
+                except PlanGenerationError as error:
+                    error_message = str(error)
+
+        return render(request, 'app-generate-plan.html', {'error_message': error_message, 'form': form})
@@ -0,0 +1,215 @@
+"""
+Vote counting for recipes.
+
+By default every vote is a single atomic `UPDATE ... SET vote = vote + n` on the
+vote column. With settings.VOTE_BUFFER enabled, votes for recipes that already
+have at least settings.VOTE_BUFFER_MIN_VOTES votes are added to a counter in the
+cache instead and written to the database later by flush_votes(), which the
+`flush_votes` management command runs once or in a loop.
+
+Buffered votes are kept in two counters per recipe, one for up and one for down
+votes. A counter starts at COUNTER_BASE rather than zero: memcached cannot store
+negative numbers and stops a decrement at zero, so only a counter that stays far
+above zero shows when a decrement took more than it held.
+Every vote bumps a counter and then appends the recipe id under the next
+journal number. A flush walks the journal from where the previous one stopped.
+Journal entries only name recipes to look at, so reading one twice is harmless.
+For every named recipe the flush takes each counter by decrementing it by the
+votes it read, and only then writes the total to the database. A decrement
+ending below COUNTER_BASE means another flush (one whose lock expired, say) took
+the same votes first, so they are given back instead of being written twice.
+Votes arriving meanwhile stay in the counters for the next flush, and a flush
+that fails after taking the votes gives them back. A journal number without an entry is either a
+vote still being written or an entry lost to a crashed worker or an eviction.
+The flush stops at such a gap the first time it sees it and skips it the next
+time. Votes whose entry was lost are written with the next vote for the same
+recipe.
+
+The cache must be shared by every process and increment atomically, which
+memcached and Redis do. VOTE_BUFFER with any other backend raises
+ImproperlyConfigured and fails the system checks (see SHARED_CACHE_BACKENDS).
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from jedzonko.models import Recipe
+
+UP_KEY = 'recipe-votes:%s:up'
+DOWN_KEY = 'recipe-votes:%s:down'
+JOURNAL_KEY = 'recipe-votes:journal:%s'
+JOURNAL_HEAD_KEY = 'recipe-votes:journal-head'
+JOURNAL_TAIL_KEY = 'recipe-votes:journal-tail'
+# Journal numbers found without an entry by the previous flush.
+JOURNAL_GAPS_KEY = 'recipe-votes:journal-gaps'
+FLUSH_LOCK_KEY = 'recipe-votes:flush-lock'
+FLUSH_LOCK_TIMEOUT = 60
+# Value of a vote counter holding no votes.
+COUNTER_BASE = 2 ** 32
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.memcached.MemcachedCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django_redis.cache.RedisCache',
+)
+
+
+def check_cache_backend():
+    """
+    Raise ImproperlyConfigured if votes are buffered in a cache that is not shared and atomic.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.VOTE_BUFFER and backend not in SHARED_CACHE_BACKENDS:
+        raise ImproperlyConfigured("VOTE_BUFFER needs a shared cache with atomic increments (%s), not %s"
+                                   % (', '.join(SHARED_CACHE_BACKENDS), backend))
+
+
+def check_vote_buffer(app_configs, **kwargs):
+    """
+    System check failing when VOTE_BUFFER is on without a suitable cache.
+    """
+    try:
+        check_cache_backend()
+    except ImproperlyConfigured as error:
+        return [checks.Error(str(error), id='jedzonko.E001')]
+    return []
+
+
+def is_buffered(recipe):
+    """
+    Return True if votes for the recipe should go through the cache counters.
+    """
+    if not settings.VOTE_BUFFER:
+        return False
+    check_cache_backend()
+    return recipe.vote >= settings.VOTE_BUFFER_MIN_VOTES
+
+
+def _incr(key, delta, initial=0):
+    cache.add(key, initial, timeout=None)
+    return cache.incr(key, delta)
+
+
+def _take(key, amount):
+    """
+    Take amount votes from the counter and return how many were taken.
+    """
+    if amount <= 0:
+        return 0
+    try:
+        remaining = cache.decr(key, amount)
+    except ValueError:
+        return 0
+    if remaining < COUNTER_BASE:
+        # Another flush took the same votes; give them back.
+        cache.incr(key, amount)
+        return 0
+    return amount
+
+
+def add_vote(recipe, vote):
+    """
+    Add a vote to the recipe and return the vote total to display.
+
+    Example usage:
+    >>> recipe = Recipe.objects.get(id=1)
+    >>> add_vote(recipe, 1)
+    13
+    """
+    if not is_buffered(recipe):
+        Recipe.objects.filter(id=recipe.id).update(vote=F('vote') + vote, updated=timezone.now())
+        return Recipe.objects.values_list('vote', flat=True).get(id=recipe.id)
+
+    _incr((UP_KEY if vote > 0 else DOWN_KEY) % recipe.id, abs(vote), COUNTER_BASE)
+    position = _incr(JOURNAL_HEAD_KEY, 1)
+    cache.set(JOURNAL_KEY % position, recipe.id, timeout=None)
+    return recipe.vote + pending_votes(recipe.id)
+
+
+def pending_votes(recipe_id):
+    """
+    Return the votes buffered for the recipe that are not in the database yet.
+    """
+    counters = cache.get_many([UP_KEY % recipe_id, DOWN_KEY % recipe_id])
+    return counters.get(UP_KEY % recipe_id, COUNTER_BASE) - counters.get(DOWN_KEY % recipe_id, COUNTER_BASE)
+
+
+def _journal(tail, head):
+    """
+    Return the recipe ids of the journal after tail and the last journal number read.
+
+    Reading stops at the first number without an entry unless the previous flush
+    found it missing as well; the numbers missing now are remembered for the next flush.
+    """
+    positions = list(range(tail + 1, head + 1))
+    entries = cache.get_many([JOURNAL_KEY % position for position in positions])
+    old_gaps = set(cache.get(JOURNAL_GAPS_KEY, ()))
+    recipe_ids = set()
+    last = tail
+    for position in positions:
+        key = JOURNAL_KEY % position
+        if key in entries:
+            recipe_ids.add(entries[key])
+        elif position not in old_gaps:
+            break
+        last = position
+    cache.set(JOURNAL_GAPS_KEY, [position for position in positions[last - tail:]
+                                 if JOURNAL_KEY % position not in entries], timeout=None)
+    return sorted(recipe_ids), last
+
+
+def flush_votes(batch_size=500):
+    """
+    Write buffered votes to the database and return the number of recipes updated.
+
+    Each batch of recipes is written with a single UPDATE statement, so the number
+    of writes depends on how many recipes were voted on, not on the number of votes.
+    A flush that finds its lock expired stops before the next batch and leaves the
+    journal to the next flush.
+    """
+    check_cache_backend()
+    token = uuid.uuid4().hex
+    if not cache.add(FLUSH_LOCK_KEY, token, timeout=FLUSH_LOCK_TIMEOUT):
+        return 0
+    try:
+        tail = cache.get(JOURNAL_TAIL_KEY, 0)
+        recipe_ids, last = _journal(tail, cache.get(JOURNAL_HEAD_KEY, 0))
+
+        updated = 0
+        for start in range(0, len(recipe_ids), batch_size):
+            if cache.get(FLUSH_LOCK_KEY) != token:
+                return updated
+            batch = recipe_ids[start:start + batch_size]
+            counters = cache.get_many([key % recipe_id for recipe_id in batch for key in (UP_KEY, DOWN_KEY)])
+            taken = {}
+            for recipe_id in batch:
+                up = _take(UP_KEY % recipe_id, counters.get(UP_KEY % recipe_id, COUNTER_BASE) - COUNTER_BASE)
+                down = _take(DOWN_KEY % recipe_id, counters.get(DOWN_KEY % recipe_id, COUNTER_BASE) - COUNTER_BASE)
+                if up or down:
+                    taken[recipe_id] = (up, down)
+            deltas = {recipe_id: up - down for recipe_id, (up, down) in taken.items() if up != down}
+            try:
+                if deltas:
+                    Recipe.objects.filter(id__in=deltas).update(vote=F('vote') + Case(
+                        *[When(id=recipe_id, then=Value(delta)) for recipe_id, delta in deltas.items()],
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    ), updated=timezone.now())
+            except Exception:
+                for recipe_id, (up, down) in taken.items():
+                    _incr(UP_KEY % recipe_id, up, COUNTER_BASE)
+                    _incr(DOWN_KEY % recipe_id, down, COUNTER_BASE)
+                raise
+            updated += len(deltas)
+
+        cache.set(JOURNAL_TAIL_KEY, last, timeout=None)
+        cache.delete_many([JOURNAL_KEY % position for position in range(tail + 1, last + 1)])
+        return updated
+    finally:
+        if cache.get(FLUSH_LOCK_KEY) == token:
+            cache.delete(FLUSH_LOCK_KEY)
@@ -0,0 +1,130 @@
+"""
+Warm-up of a new worker process before it serves its first request.
+
+A fresh process compiles each template, builds the URL resolver and connects
+to the database the first time a request needs them, so its first requests
+are slow. warmup() does that work up front: it compiles every template of the
+project and compiles every URL pattern and builds the reverse lookup. With the
+cached template loader (DEBUG off) the compiled templates are kept for the life
+of the process.
+
+Database connections belong to the thread that opens them, so opening them
+helps only when that thread then serves the requests: a prefork server whose
+workers import the application themselves (gunicorn sync workers without
+--preload). A threaded server never uses connections opened by the thread
+importing the application, so the databases step runs only when asked for,
+with settings.WARMUP_DATABASES, and the connections stay open for the first
+request only when CONN_MAX_AGE allows it.
+
+scrumlab/wsgi.py calls warmup() when settings.WARMUP_ON_START is on. With a
+server that imports the application before forking its workers (gunicorn
+--preload), turn WARMUP_ON_START off and call warmup() in a post-fork hook
+instead, so the workers do not share database connections.
+"""
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger('jedzonko.warmup')
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def template_names(directory):
+    """
+    Return the names of the templates in a template directory, relative to it.
+    """
+    names = []
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            if file_name.endswith(TEMPLATE_EXTENSIONS):
+                names.append(os.path.relpath(os.path.join(root, file_name), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    Compile the templates of the project directories and of the jedzonko app, return how many.
+    """
+    count = 0
+    app_templates = os.path.join(apps.get_app_config('jedzonko').path, 'templates')
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for directory in list(backend.engine.dirs) + [app_templates]:
+            for name in template_names(directory):
+                try:
+                    backend.get_template(name)
+                except TemplateSyntaxError as error:
+                    logger.warning('Template %s does not compile: %s', name, error)
+                else:
+                    count += 1
+    return count
+
+
+def warm_urls(resolver=None):
+    """
+    Compile the pattern of every URL and build the reverse lookup, return the number of URLs.
+    """
+    if resolver is None:
+        resolver = get_resolver()
+        resolver.reverse_dict  # Populated on first access.
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex  # Compiled on first access.
+        if isinstance(pattern, URLResolver):
+            count += warm_urls(pattern)
+        else:
+            count += 1
+    return count
+
+
+def warm_databases():
+    """
+    Open a connection to every database, return how many were opened.
+    """
+    count = 0
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as error:
+            logger.warning('Cannot connect to database %s: %s', alias, error)
+        else:
+            count += 1
+    return count
+
+
+STEPS = (
+    ('templates', warm_templates),
+    ('urls', warm_urls),
+    ('databases', warm_databases),
+)
+
+
+def warmup(databases=None):
+    """
+    Run the warm-up steps and return a list of (step, count, seconds).
+
+    The databases step runs when databases is true, by default when settings.WARMUP_DATABASES is on.
+
+    Example usage:
+    >>> warmup(databases=True)
+    [('templates', 21, 0.034), ('urls', 53, 0.004), ('databases', 1, 0.002)]
+    """
+    if databases is None:
+        databases = settings.WARMUP_DATABASES
+    timings = []
+    for step, function in STEPS:
+        if step == 'databases' and not databases:
+            continue
+        start = time.perf_counter()
+        count = function()
+        timings.append((step, count, time.perf_counter() - start))
+    return timings
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'jedzonko.instrumentation.TimingMiddleware',
+    'jedzonko.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,11 +57,15 @@ ROOT_URLCONF = 'scrumlab.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'jedzonko.instrumentation.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
 
-        'APP_DIRS': True,
+        'APP_DIRS': False,
         'OPTIONS': {
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -114,9 +120,147 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
+# `python manage.py collectstatic` writes the files with hashed names and their
+# gzip (and brotli) variants to STATIC_ROOT, where scrumlab/wsgi.py serves them.
+# Hashed names are cached by browsers for a year, plain names for STATIC_MAX_AGE
+# seconds.
+
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+STATICFILES_STORAGE = 'jedzonko.staticfiles.CompressedManifestStaticFilesStorage'
+
+STATIC_MAX_AGE = 60
+
+# Caching
+# Rendered plan weeks, recipe bodies and shopping lists are cached under the
+# version of their recipe or plan (see jedzonko.versions) for at most
+# FRAGMENT_CACHE_TIMEOUT seconds. The versions live in the cache too, so every
+# worker process must use the same cache: the file-based cache works on one
+# machine, memcached (set CACHES in local_settings.py) on several. Tests use a
+# cache in memory of their own (jedzonko.test_runner).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+}
+
+TEST_RUNNER = 'jedzonko.test_runner.TestRunner'
+
+FRAGMENT_CACHE_TIMEOUT = 86400
+
+# Recipe search
+# At most SEARCH_RESULTS_LIMIT recipes are listed for a query. Relevance is scaled
+# by 1 + vote / (vote + SEARCH_VOTE_DAMPING), so votes can at most double it.
+
+SEARCH_RESULTS_LIMIT = 50
+
+SEARCH_VOTE_DAMPING = 10
+
+# Similar recipes
+# SIMILAR_RECIPES recipes with similar ingredients are listed on a recipe page.
+# The list is cached for SIMILAR_RECIPES_TIMEOUT seconds, so new recipes show up
+# in the lists of older ones after at most that long.
+
+SIMILAR_RECIPES = 5
+
+SIMILAR_RECIPES_TIMEOUT = 3600
+
+# Recipe votes
+# Votes for recipes with at least VOTE_BUFFER_MIN_VOTES votes are buffered in the
+# cache and written by `python manage.py flush_votes` when VOTE_BUFFER is enabled.
+# Buffering needs a cache shared by all processes with atomic incr/decr (memcached
+# or redis); the jedzonko.E001 check fails with any other CACHES backend.
+
+VOTE_BUFFER = False
+
+VOTE_BUFFER_MIN_VOTES = 100
+
+# Plan generator
+# The recipe index used to generate plans is kept in memory and reloaded after
+# PLAN_GENERATOR_INDEX_TIMEOUT seconds.
+
+PLAN_GENERATOR_INDEX_TIMEOUT = 300
+
+# Read replicas
+# Reads of GET requests go to one of DATABASE_REPLICAS, by default every alias in
+# DATABASES other than 'default'. After any other request the client reads from
+# 'default' for REPLICA_STICKY_SECONDS, so it sees its own writes.
+
+DATABASE_ROUTERS = ['jedzonko.routers.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = 10
+
+# Request timings
+# A TIMING_SAMPLE_RATE fraction of requests gets a Server-Timing header with the
+# SQL, template and total time. Sampled requests taking SLOW_REQUEST_THRESHOLD
+# seconds or more are logged as JSON lines to the 'jedzonko.slow_requests' logger
+# with their SLOW_REQUEST_QUERIES slowest SQL statements.
+
+TIMING_SAMPLE_RATE = 1.0
+
+SLOW_REQUEST_THRESHOLD = 0.5
+
+SLOW_REQUEST_QUERIES = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'jedzonko.slow_requests': {'handlers': ['slow_requests'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 try:
     from scrumlab.local_settings import DATABASES
 except ModuleNotFoundError:
     print("Brak konfiguracji bazy danych w pliku local_settings.py!")
     print("Uzupełnij dane i spróbuj ponownie!")
     exit(0)
+
+try:
+    from scrumlab.local_settings import DATABASE_REPLICAS
+except ImportError:
+    DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+try:
+    from scrumlab.local_settings import CACHES  # noqa: F811
+except ImportError:
+    pass
+
+# Production
+# local_settings.py turns DEBUG off and lists ALLOWED_HOSTS. Without DEBUG every
+# worker compiles a template once and keeps it (the cached template loader), and
+# scrumlab/wsgi.py warms a new worker up before its first request (see
+# jedzonko.warmup) unless WARMUP_ON_START is off. WARMUP_DATABASES also opens the
+# database connections then; turn it on only for a prefork server serving
+# requests from the thread that imports the application, such as gunicorn sync
+# workers without --preload.
+
+WARMUP_ON_START = True
+
+WARMUP_DATABASES = False
+
+try:
+    from scrumlab.local_settings import DEBUG  # noqa: F811
+except ImportError:
+    pass
+
+try:
+    from scrumlab.local_settings import ALLOWED_HOSTS  # noqa: F811
+except ImportError:
+    pass
+
+try:
+    from scrumlab.local_settings import WARMUP_DATABASES  # noqa: F811
+except ImportError:
+    pass
+
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', TEMPLATES[0]['OPTIONS']['loaders']),
+    ]
@@ -16,6 +16,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from jedzonko.api import (
+    RecipeListApiView,
+    RecipeApiView,
+    PlanListApiView,
+    PlanApiView,
+    PlanWeekApiView,
+    PlanMealsApiView,
+)
 from jedzonko.views import (
     IndexView,
     DashboardView,
@@ -29,6 +37,10 @@ from jedzonko.views import (
     PlanDetailsView,
     LogInView,
     RegisterView,
+    ShoppingListView,
+    ClonePlanView,
+    PlanExportView,
+    GeneratePlanView,
 )
 
 urlpatterns = [
@@ -42,7 +54,18 @@ urlpatterns = [
     path('recipe/add/', AddRecipeView.as_view(), name='add_recipe'),
     path('recipe/modify/<int:id>/', RecipeModifyView.as_view(), name='modify_recipe'),
     path('plan/add/', AddPlanView.as_view(), name='add_plan'),
+    path('plan/generate/', GeneratePlanView.as_view(), name='generate_plan'),
     path('plan/add-recipe/', AddRecipeToPlanView.as_view(), name='add_recipe_to_plan'),
     path('plan/list/', PlanListView.as_view(), name='plan_list'),
     path('plan/<int:id>/', PlanDetailsView.as_view(), name='plan_details'),
+    path('plan/<int:id>/clone/', ClonePlanView.as_view(), name='clone_plan'),
+    path('plan/<int:id>/shopping-list/', ShoppingListView.as_view(), name='shopping_list'),
+    path('plan/<int:id>/export.ics', PlanExportView.as_view(), {'format': 'ics'}, name='plan_export_ics'),
+    path('plan/<int:id>/export.csv', PlanExportView.as_view(), {'format': 'csv'}, name='plan_export_csv'),
+    path('api/recipes/', RecipeListApiView.as_view(), name='api_recipe_list'),
+    path('api/recipes/<int:id>/', RecipeApiView.as_view(), name='api_recipe'),
+    path('api/plans/', PlanListApiView.as_view(), name='api_plan_list'),
+    path('api/plans/<int:id>/', PlanApiView.as_view(), name='api_plan'),
+    path('api/plans/<int:id>/week/', PlanWeekApiView.as_view(), name='api_plan_week'),
+    path('api/plans/<int:id>/meals/', PlanMealsApiView.as_view(), name='api_plan_meals'),
 ]
\ No newline at end of file
@@ -2,6 +2,9 @@
 WSGI config for scrumlab project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Collected static files are served by jedzonko.staticfiles.StaticFilesApp in
+front of Django, and a new worker is warmed up (jedzonko.warmup) when
+settings.WARMUP_ON_START is on.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/2.1/howto/deployment/wsgi/
@@ -9,8 +12,17 @@ https://docs.djangoproject.com/en/2.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scrumlab.settings')
 
 application = get_wsgi_application()
+
+from jedzonko.staticfiles import StaticFilesApp  # noqa: E402 (needs the settings loaded above)
+from jedzonko.warmup import warmup  # noqa: E402
+
+if settings.WARMUP_ON_START:
+    warmup()
+
+application = StaticFilesApp(application)